@@ -0,0 +1,333 @@
+"""
+Configuration - schema, validation, timing profiles and hot reload of
+config.json
+
+Kept free of GUI imports so the headless tools (orchestration.py,
+scheduler.py) can load it without tkinter, pyautogui or a display.
+"""
+
+import copy
+import json
+from pathlib import Path
+
+from event_log import LEVELS
+import postprocess
+
+
+# ==============================================================================
+# CONFIGURATION MANAGER
+# ==============================================================================
+
+# Schema: key -> (allowed types, default, minimum, maximum)
+# Positions are [x, y] lists (or None until calibrated); regions are
+# [x, y, width, height]; delays are seconds.
+# For "choice" keys the third field is the tuple of allowed values.
+CONFIG_SCHEMA = {
+    "ok_button": ("position", None, None, None),
+    "live_image_button": ("position", None, None, None),
+    "capture_delay": ((int, float), 1.0, 0.0, 60.0),
+    "ok_delay": ((int, float), 0.8, 0.0, 60.0),
+    "live_delay": ((int, float), 0.5, 0.0, 60.0),
+    "arrow_delay": ((int, float), 0.3, 0.0, 60.0),
+    "reversal_delay": ((int, float), 0.5, 0.0, 60.0),
+    "row_change_delay": ((int, float), 0.4, 0.0, 60.0),
+    "key_interval": ((int, float), 0.05, 0.0, 5.0),
+    "scan_pattern": ("choice", "serpentine", ("serpentine", "raster", "auto"), None),
+    "log_file": ((str,), "automation.log", None, None),
+    "log_level": ("choice", "DEBUG", LEVELS, None),
+    "ui_log_level": ("choice", "INFO", LEVELS, None),
+    "ui_debug_sample": ((int,), 1, 1, 1000),
+    "profiling": ((bool,), False, None, None),
+    "profile_interval": ((int, float), 0.005, 0.001, 0.1),
+    "actions": ("actions", {"ok": {"method": "click"}, "live_image": {"method": "click"}}, None, None),
+    "output_dir": ((str,), "", None, None),
+    "overview_source": ("choice", "off", ("off", "file", "screen"), None),
+    "live_view_region": ("region", None, None, None),
+    "overview_fps": ((int, float), 2.0, 0.2, 30.0),
+    "scan_mode": ("choice", "full", ("full", "adaptive"), None),
+    "coarse_step": ((int,), 3, 2, 50),
+    "content_threshold": ((int, float), 8.0, 0.0, 255.0),
+    "bit_depth": ((int,), 16, 9, 16),
+    "compress": ("choice", "off", ("off",) + postprocess.MODES, None),
+    "compress_workers": ((int,), 2, 1, 16),
+    "compress_queue": ((int,), 32, 1, 1000),
+    "compress_chunk": ((int,), 50, 1, 100000),
+}
+
+# Capture steps that can be mapped to an action, and the available methods:
+#   click  - move to the calibrated position and click
+#   hotkey - press "keys" (e.g. ["enter"]), no mouse involved
+ACTION_STEPS = ("ok", "live_image")
+ACTION_METHODS = ("click", "hotkey")
+
+# Keys a profile is allowed to override (timings only, never calibration)
+PROFILE_KEYS = ("capture_delay", "ok_delay", "live_delay", "arrow_delay",
+                "reversal_delay", "row_change_delay", "key_interval")
+
+# Built-in profiles; user profiles in config.json["profiles"] override these
+BUILTIN_PROFILES = {
+    "fast 10x": {
+        "capture_delay": 0.6,
+        "ok_delay": 0.5,
+        "live_delay": 0.3,
+        "arrow_delay": 0.2
+    },
+    "slow 40x fluorescence": {
+        "capture_delay": 3.0,
+        "ok_delay": 1.0,
+        "live_delay": 0.8,
+        "arrow_delay": 0.6
+    }
+}
+
+
+def validate_value(key, value, fallback=None):
+    """
+    Check one setting against CONFIG_SCHEMA
+
+    Args:
+        fallback: Value to use if invalid (default: the schema default)
+
+    Returns:
+        (value, error) - value is coerced/normalised, error is None if valid
+    """
+    kind, default, low, high = CONFIG_SCHEMA[key]
+    if fallback is not None:
+        default = fallback
+
+    if kind == "position":
+        if value is None:
+            return None, None
+        if (isinstance(value, (list, tuple)) and len(value) == 2 and
+                all(isinstance(v, int) and not isinstance(v, bool) for v in value)):
+            return [value[0], value[1]], None
+        return default, f"{key}: expected [x, y] integers, got {value!r}"
+
+    if kind == "region":
+        if value is None:
+            return None, None
+        if (isinstance(value, (list, tuple)) and len(value) == 4 and
+                all(isinstance(v, int) and not isinstance(v, bool) for v in value) and
+                value[2] > 0 and value[3] > 0):
+            return list(value), None
+        return default, f"{key}: expected [x, y, width, height] integers, got {value!r}"
+
+    if kind == "actions":
+        return validate_actions(key, value, default)
+
+    if kind == "choice":
+        if value in low:
+            return value, None
+        return default, f"{key}: expected one of {', '.join(low)}, got {value!r}"
+
+    if (isinstance(value, bool) and bool not in kind) or not isinstance(value, kind):
+        expected = " or ".join(t.__name__ for t in kind)
+        return default, f"{key}: expected {expected}, got {value!r}"
+    if (low is not None and value < low) or (high is not None and value > high):
+        return default, f"{key}: {value} outside {low}-{high}"
+    return (float(value) if float in kind else value), None
+
+
+def validate_action(action):
+    """Error message for one action dict, or None if valid"""
+    if not isinstance(action, dict) or action.get("method") not in ACTION_METHODS:
+        return f"expected {{\"method\": one of {', '.join(ACTION_METHODS)}}}"
+    if action["method"] == "hotkey":
+        keys = action.get("keys")
+        if (not isinstance(keys, list) or not keys or
+                not all(isinstance(k, str) and k for k in keys)):
+            return "hotkey needs a non-empty \"keys\" list"
+    return None
+
+
+def validate_actions(key, value, default):
+    """Validate the capture-step action map, keeping defaults for bad steps"""
+    if not isinstance(value, dict):
+        return dict(default), f"{key}: expected an object"
+    
+    actions = dict(default)
+    errors = []
+    for step, action in value.items():
+        if step not in ACTION_STEPS:
+            errors.append(f"{key}.{step}: unknown step")
+            continue
+        if isinstance(action, dict) and action.get("method") == "click_cached":
+            # Older configs: click_cached never clicked in place, so it was a click
+            action = {"method": "click"}
+        error = validate_action(action)
+        if error:
+            errors.append(f"{key}.{step}: {error}")
+            continue
+        actions[step] = action
+    return actions, "; ".join(errors) or None
+
+
+class Config:
+    """
+    Handles loading, validating and saving configuration
+
+    Stored keys are merged over CONFIG_SCHEMA defaults, so new settings
+    appear automatically in old config files. Invalid values fall back
+    to their default and are reported in self.errors. An optional named
+    profile ("active_profile") overlays timing values on top.
+    """
+    
+    def __init__(self, file="config.json"):
+        self.file = Path(file)
+        self.errors = []
+        self.mtime = None
+        self.data = self.load()
+    
+    def defaults(self):
+        """Default settings from the schema"""
+        data = {key: copy.deepcopy(spec[1]) for key, spec in CONFIG_SCHEMA.items()}
+        data["profiles"] = {}
+        data["active_profile"] = None
+        return data
+    
+    def read(self):
+        """Read the raw stored dict from config.json (raises on bad file)"""
+        self.mtime = self.file.stat().st_mtime
+        with open(self.file, 'r') as f:
+            stored = json.load(f)
+        if not isinstance(stored, dict):
+            raise ValueError("top level must be an object")
+        return stored
+    
+    def load(self):
+        """Load config from file merged over defaults, or create default"""
+        self.errors = []
+        data = self.defaults()
+        
+        if not self.file.exists():
+            self.mtime = None
+            return data
+        
+        try:
+            stored = self.read()
+        except (OSError, ValueError) as e:
+            self.errors.append(f"{self.file}: {e}")
+            return data
+        
+        return self.merge(data, stored)
+    
+    def merge(self, data, stored):
+        """
+        Validate stored values and merge them into data
+
+        Invalid values keep whatever data already holds: the defaults on
+        load, the running settings on a live reload.
+        """
+        previous_profile = data.get("active_profile")
+        for key, value in stored.items():
+            if key in CONFIG_SCHEMA:
+                value, error = validate_value(key, value, data[key])
+                if error:
+                    self.errors.append(error)
+                data[key] = value
+            elif key == "profiles":
+                data["profiles"] = self.validate_profiles(value)
+            elif key == "active_profile":
+                data["active_profile"] = value if isinstance(value, str) else None
+            else:
+                # Keep unknown keys so newer/older versions don't lose data
+                data[key] = value
+        
+        profile = data["active_profile"]
+        if profile is not None and profile not in self.profile_names(data):
+            self.errors.append(f"active_profile: unknown profile {profile!r}")
+            if previous_profile in self.profile_names(data):
+                data["active_profile"] = previous_profile
+            else:
+                data["active_profile"] = None
+        
+        return data
+    
+    def validate_profiles(self, profiles):
+        """Validate user-defined profiles, dropping bad entries"""
+        if not isinstance(profiles, dict):
+            self.errors.append("profiles: expected an object")
+            return {}
+        
+        valid = {}
+        for name, values in profiles.items():
+            if not isinstance(values, dict):
+                self.errors.append(f"profiles.{name}: expected an object")
+                continue
+            valid[name] = {}
+            for key, value in values.items():
+                if key not in PROFILE_KEYS:
+                    self.errors.append(f"profiles.{name}: unknown key {key!r}")
+                    continue
+                value, error = validate_value(key, value)
+                if error:
+                    self.errors.append(f"profiles.{name}.{error}")
+                    continue
+                valid[name][key] = value
+        return valid
+    
+    def reload_if_changed(self):
+        """
+        Reload config.json if it was modified since the last load
+
+        A file that fails to parse (e.g. half-saved by an editor) keeps
+        the current settings so a running scan is never disturbed. Keys
+        that are missing or invalid keep their current value, so a bad
+        edit can't e.g. un-calibrate a button mid-run.
+
+        Returns:
+            True if new settings were loaded
+        """
+        try:
+            mtime = self.file.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        
+        try:
+            stored = self.read()
+        except (OSError, ValueError) as e:
+            self.errors = [f"{self.file}: {e}"]
+            return False
+        
+        self.errors = []
+        self.data = self.merge(copy.deepcopy(self.data), stored)
+        return True
+    
+    def save(self):
+        """Save config to file"""
+        with open(self.file, 'w') as f:
+            json.dump(self.data, f, indent=2)
+    
+    def profile_names(self, data=None):
+        """Names of all available profiles (built-in and user)"""
+        data = self.data if data is None else data
+        names = list(BUILTIN_PROFILES)
+        names += [name for name in data.get("profiles", {}) if name not in names]
+        return names
+    
+    def set_profile(self, name):
+        """Select a named profile (None for plain config values)"""
+        if name is not None and name not in self.profile_names():
+            raise ValueError(f"Unknown profile: {name}")
+        self.data["active_profile"] = name
+    
+    def settings(self, profile=None):
+        """
+        Effective settings: stored values with a profile applied
+        
+        Args:
+            profile: Profile name to apply instead of the active one
+        """
+        settings = dict(self.data)
+        name = profile or self.data.get("active_profile")
+        if name:
+            settings.update(BUILTIN_PROFILES.get(name, {}))
+            settings.update(self.data["profiles"].get(name, {}))
+        return settings
+    
+    def is_calibrated(self):
+        """Check if buttons are calibrated"""
+        return (self.data.get('ok_button') is not None and 
+                self.data.get('live_image_button') is not None)
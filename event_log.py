@@ -0,0 +1,122 @@
+"""
+Structured event logging - levelled, lazily formatted, written to a
+rotating file by a background thread, with a sampled view for the UI
+
+Levels used by the automation:
+    DEBUG   - every keypress / click (per step)
+    INFO    - one line per tile, start/finish
+    WARNING - retries, config problems
+    ERROR   - failures that stop a run
+
+Log with %-style arguments, not f-strings, so nothing is formatted for
+records that are filtered out:
+    log.debug("Pressing %s arrow", direction)
+"""
+
+import logging
+import queue
+from collections import deque
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOGGER_NAME = "bzx800"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+UI_BUFFER = 500
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+
+    The stock handler formats every record in the calling thread; here the
+    record is queued untouched so the automation thread only pays for an
+    enqueue. Only pass plain values (str/int/float) as log arguments.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class UILogView(logging.Handler):
+    """
+    Bounded, sampled buffer of records for display in a Tk widget
+
+    Records below INFO are thinned to one in `debug_sample`. The buffer
+    drops the oldest entries if the UI falls behind, so it never blocks
+    the automation thread. The UI calls drain() from its own thread.
+    """
+
+    def __init__(self, level=logging.INFO, debug_sample=1):
+        super().__init__(level)
+        self.debug_sample = max(1, int(debug_sample))
+        self.debug_seen = 0
+        self.records = deque(maxlen=UI_BUFFER)
+
+    def emit(self, record):
+        if record.levelno < logging.INFO:
+            self.debug_seen += 1
+            if self.debug_seen % self.debug_sample:
+                return
+        self.records.append(record)
+
+    def drain(self):
+        """Formatted lines for all buffered records"""
+        lines = []
+        while self.records:
+            record = self.records.popleft()
+            timestamp = datetime.fromtimestamp(record.created).strftime("%H:%M:%S")
+            if record.levelno >= logging.WARNING:
+                lines.append(f"[{timestamp}] {record.levelname}: {record.getMessage()}")
+            else:
+                lines.append(f"[{timestamp}] {record.getMessage()}")
+        return lines
+
+
+class EventLog:
+    """
+    Owns the background file writer and the UI view for one process
+
+    Args:
+        log_file: Path of the rotating log file
+        level: Lowest level recorded at all (file gets everything recorded)
+        ui_level: Lowest level shown in the UI view
+        debug_sample: Show one in N DEBUG records in the UI
+    """
+
+    def __init__(self, log_file="automation.log", level="DEBUG", ui_level="INFO",
+                 debug_sample=1):
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)-7s %(threadName)s %(message)s"
+        ))
+
+        self.ui = UILogView(getattr(logging, ui_level), debug_sample)
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self.handler = DeferredQueueHandler(self.queue)
+
+        log.setLevel(getattr(logging, level))
+        log.propagate = False
+        log.addHandler(self.handler)
+        log.addHandler(self.ui)
+        self.listener.start()
+
+    def set_levels(self, level, ui_level, debug_sample=None):
+        """Change levels on a live run (e.g. after a config reload)"""
+        log.setLevel(getattr(logging, level))
+        self.ui.setLevel(getattr(logging, ui_level))
+        if debug_sample is not None:
+            self.ui.debug_sample = max(1, int(debug_sample))
+
+    def close(self):
+        """Flush the file writer and detach handlers"""
+        log.removeHandler(self.handler)
+        log.removeHandler(self.ui)
+        self.listener.stop()
@@ -1,41 +1,48 @@
 """
-Grid navigation - generates serpentine path for microscope stage
+Grid navigation - the path through the grid and the stage moves between
+tiles, for full scans and adaptive coarse-then-refine scans
 """
 
+# pyautogui.PAUSE (its default): slept once after every press() call
+GUI_PAUSE = 0.1
+
 class GridNavigator:
     """
-    Generates serpentine scanning pattern for grid capture
-    
-    Example 3x3 grid:
-        (0,0) → (0,1) → (0,2)
-                          ↓
-        (1,2) ← (1,1) ← (1,0)
-          ↓
-        (2,0) → (2,1) → (2,2)
+    Plans the path through the grid
+    
+    Patterns:
+        serpentine - alternate row direction (one X reversal per row)
+        raster     - every row left to right; the return stroke is one
+                     batched move that overshoots and comes back, so the
+                     X backlash is always taken up in the same direction
     """
     
-    def __init__(self, width, height):
-        """
-        Args:
-            width: Number of images across
-            height: Number of images down
-        """
+    PATTERNS = ('serpentine', 'raster')
+    
+    def __init__(self, width, height, pattern='serpentine'):
+        if pattern not in self.PATTERNS:
+            raise ValueError(f"Unknown scan pattern: {pattern}")
         self.width = width
         self.height = height
         self.total = width * height
+        self.pattern = pattern
     
-    def generate_path(self):
+    def get_path(self):
         """
-        Generate complete serpentine path
+        Generate path (serpentine by default)
         
-        Returns:
-            List of (row, col) tuples
+        Example 3x3 serpentine:
+        (0,0) -> (0,1) -> (0,2)
+                           |
+        (1,2) <- (1,1) <- (1,0)
+          |
+        (2,0) -> (2,1) -> (2,2)
         """
         path = []
         
         for row in range(self.height):
-            if row % 2 == 0:
-                # Even rows: left to right
+            if row % 2 == 0 or self.pattern == 'raster':
+                # Even rows (every row for raster): left to right
                 for col in range(self.width):
                     path.append((row, col))
             else:
@@ -45,46 +52,211 @@ class GridNavigator:
         
         return path
     
-    def get_movement(self, current, next_pos):
-        """
-        Get movement direction between positions
-        
-        Args:
-            current: (row, col)
-            next_pos: (row, col)
-            
-        Returns:
-            'right', 'left', or 'down'
-        """
-        curr_row, curr_col = current
+    def get_movement(self, current_pos, next_pos):
+        """Calculate movement direction between two positions"""
+        curr_row, curr_col = current_pos
         next_row, next_col = next_pos
         
         if next_row > curr_row:
             return 'down'
-        if next_col > curr_col:
+        elif next_col > curr_col:
             return 'right'
-        if next_col < curr_col:
+        elif next_col < curr_col:
             return 'left'
-        
-        return 'right'
+        else:
+            return 'right'
     
-    def iter_path_with_movements(self):
+    def get_moves(self):
         """
-        Iterate through path with movement info
-        
-        Yields:
-            (index, total, position, movement)
-            - index: Current position (0-based)
-            - total: Total positions
-            - position: (row, col)
-            - movement: Direction ('start' for first position)
+        Path with the arrow presses needed to reach each position
+        
+        Each move is labelled with a class that selects its settle time:
+            'start'      - first position, no move
+            'same'       - continues in the previous X direction
+            'reversal'   - X direction flipped (stage backlash)
+            'row_change' - includes a move down to the next row
+        
+        Returns:
+            List of (position, directions, move_class)
         """
-        path = self.generate_path()
+        path = self.get_path()
+        moves = [(path[0], [], 'start')]
+        last_x = None
         
-        for i, pos in enumerate(path):
-            if i == 0:
-                movement = 'start'
+        for prev, pos in zip(path, path[1:]):
+            if self.pattern == 'raster' and pos[0] > prev[0]:
+                # Return stroke: overshoot one step left, go down, then
+                # approach column 0 moving right like every other tile
+                directions = ['left'] * (prev[1] + 1) + ['down'] + ['right']
             else:
-                movement = self.get_movement(path[i-1], pos)
+                directions = [self.get_movement(prev, pos)]
             
-            yield i, self.total, pos, movement
+            moves.append((pos, directions, self.classify(directions, last_x)))
+            for direction in directions:
+                if direction in ('left', 'right'):
+                    last_x = direction
+        
+        return moves
+    
+    @staticmethod
+    def classify(directions, last_x):
+        """Move class for a batch of presses given the last X direction"""
+        if 'down' in directions or 'up' in directions:
+            return 'row_change'
+        if last_x is not None and directions[0] != last_x:
+            return 'reversal'
+        return 'same'
+    
+    def estimate_seconds(self, settings):
+        """
+        Predicted total movement time (settle waits plus key spacing)
+        
+        Args:
+            settings: dict with arrow_delay, reversal_delay,
+                      row_change_delay and key_interval
+        """
+        return sum(self.move_seconds(directions, move_class, settings)
+                   for pos, directions, move_class in self.get_moves())
+    
+    @staticmethod
+    def key_runs(directions):
+        """Runs of the same direction as [(direction, count), ...]"""
+        runs = []
+        for direction in directions:
+            if runs and runs[-1][0] == direction:
+                runs[-1] = (direction, runs[-1][1] + 1)
+            else:
+                runs.append((direction, 1))
+        return runs
+    
+    @classmethod
+    def move_seconds(cls, directions, move_class, settings):
+        """
+        Predicted time of one move (see MicroscopeController.move)
+        
+        Each run of the same key is one press() call: key_interval after
+        every key in a batch, plus pyautogui's pause once per call.
+        """
+        settle = {
+            'start': 0.0,
+            'same': settings['arrow_delay'],
+            'reversal': settings['reversal_delay'],
+            'row_change': settings['row_change_delay']
+        }
+        seconds = settle[move_class] + len(cls.key_runs(directions)) * GUI_PAUSE
+        if len(directions) > 1:
+            seconds += len(directions) * settings['key_interval']
+        return seconds
+    
+    @classmethod
+    def fastest_pattern(cls, width, height, settings):
+        """Pattern with the lowest estimated movement time"""
+        return min(
+            cls.PATTERNS,
+            key=lambda pattern: cls(width, height, pattern).estimate_seconds(settings)
+        )
+
+
+class AdaptiveGridPlanner:
+    """
+    Two-level scan: a coarse pass over every `step`-th tile in each axis,
+    then a refine pass over the tiles near coarse tiles with content
+    
+    Coarse moves are bursts of `step` arrow presses. A tile is refined if
+    any coarse tile within `step - 1` tiles of it (in both axes) scored at
+    or above the threshold.
+    """
+    
+    def __init__(self, width, height, step):
+        self.width = width
+        self.height = height
+        self.step = max(1, step)
+    
+    def coarse_positions(self):
+        """Coarse grid positions in serpentine order"""
+        rows = range(0, self.height, self.step)
+        cols = list(range(0, self.width, self.step))
+        path = []
+        for i, row in enumerate(rows):
+            for col in (cols if i % 2 == 0 else reversed(cols)):
+                path.append((row, col))
+        return path
+    
+    def coarse_moves(self):
+        """Coarse pass as (position, directions, move_class)"""
+        return self.moves_through(None, self.coarse_positions())
+    
+    def refine_targets(self, scores, threshold):
+        """
+        Tiles to capture in the refine pass
+        
+        Args:
+            scores: {(row, col): score} for coarse tiles; a missing or None
+                    score counts as content (never skip what wasn't seen)
+            threshold: Minimum score that counts as content
+        """
+        coarse = self.coarse_positions()
+        hot = [pos for pos in coarse
+               if scores.get(pos) is None or scores[pos] >= threshold]
+        
+        reach = self.step - 1
+        targets = set()
+        for row, col in hot:
+            for r in range(max(0, row - reach), min(self.height, row + reach + 1)):
+                for c in range(max(0, col - reach), min(self.width, col + reach + 1)):
+                    targets.add((r, c))
+        return targets - set(coarse)
+    
+    def refine_moves(self, start, targets, last_x=None):
+        """
+        Refine pass from `start` through targets row by row, beginning with
+        whichever end of the slide is closer and entering each row from
+        the end nearest the stage
+        """
+        rows = sorted({row for row, col in targets})
+        if rows and abs(start[0] - rows[-1]) < abs(start[0] - rows[0]):
+            rows.reverse()
+        
+        path = []
+        current_col = start[1]
+        for row in rows:
+            cols = sorted(col for r, col in targets if r == row)
+            if abs(cols[-1] - current_col) < abs(cols[0] - current_col):
+                cols.reverse()
+            path += [(row, col) for col in cols]
+            current_col = cols[-1]
+        
+        return self.moves_through(start, path, last_x)[1:] if path else []
+    
+    @staticmethod
+    def last_x(moves):
+        """Last left/right direction pressed in a list of moves"""
+        for pos, directions, move_class in reversed(moves):
+            for direction in reversed(directions):
+                if direction in ('left', 'right'):
+                    return direction
+        return None
+    
+    @staticmethod
+    def moves_through(start, path, last_x=None):
+        """
+        Batched arrow presses visiting path in order
+        
+        Args:
+            start: Current stage position, or None if path[0] is current
+            last_x: Last left/right direction before start (for backlash)
+        """
+        positions = ([start] if start is not None else []) + list(path)
+        moves = [(positions[0], [], 'start')]
+        
+        for prev, pos in zip(positions, positions[1:]):
+            d_row, d_col = pos[0] - prev[0], pos[1] - prev[1]
+            directions = (['down'] * d_row if d_row > 0 else ['up'] * -d_row)
+            directions += (['right'] * d_col if d_col > 0 else ['left'] * -d_col)
+            
+            moves.append((pos, directions, GridNavigator.classify(directions, last_x)))
+            for direction in directions:
+                if direction in ('left', 'right'):
+                    last_x = direction
+        
+        return moves
@@ -9,52 +9,19 @@ Date: 2026
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import pyautogui
-import json
 import time
 import threading
-from pathlib import Path
 from datetime import datetime
+from itertools import accumulate
 
-
-# ==============================================================================
-# CONFIGURATION MANAGER
-# ==============================================================================
-
-class Config:
-    """Handles loading and saving configuration"""
-    
-    def __init__(self):
-        self.file = Path("config.json")
-        self.data = self.load()
-    
-    def load(self):
-        """Load config from file, or create default"""
-        default = {
-            "ok_button": None,
-            "live_image_button": None,
-            "capture_delay": 1.0,
-            "ok_delay": 0.8,
-            "live_delay": 0.5,
-            "arrow_delay": 0.3
-        }
-        
-        if self.file.exists():
-            try:
-                with open(self.file, 'r') as f:
-                    return json.load(f)
-            except:
-                return default
-        return default
-    
-    def save(self):
-        """Save config to file"""
-        with open(self.file, 'w') as f:
-            json.dump(self.data, f, indent=2)
-    
-    def is_calibrated(self):
-        """Check if buttons are calibrated"""
-        return (self.data.get('ok_button') is not None and 
-                self.data.get('live_image_button') is not None)
+from config import ACTION_STEPS, BUILTIN_PROFILES, Config
+from event_log import EventLog, log
+from grid_navigator import AdaptiveGridPlanner, GridNavigator
+from profiling import SamplingProfiler, format_report
+from scheduler import LatencyProfile, predicted_tile_seconds
+import overview
+import postprocess
+from saved_tiles import SavedTileWatcher
 
 
 # ==============================================================================
@@ -65,6 +32,13 @@ class MicroscopeController:
     """Controls microscope via GUI automation"""
     
     def __init__(self, config):
+        self.apply_settings(config)
+        
+        # Safety: move mouse to corner to abort
+        pyautogui.FAILSAFE = True
+    
+    def apply_settings(self, config):
+        """Take positions and delays from a settings dict (safe mid-run)"""
         self.config = config
         
         # Get button positions from config
@@ -77,93 +51,158 @@ class MicroscopeController:
         self.live_delay = config['live_delay']
         self.arrow_delay = config['arrow_delay']
         
-        # Safety: move mouse to corner to abort
-        pyautogui.FAILSAFE = True
+        # Settle time after a move, by move class (see GridNavigator.get_moves)
+        self.settle_delays = {
+            'same': config['arrow_delay'],
+            'reversal': config['reversal_delay'],
+            'row_change': config['row_change_delay']
+        }
+        self.key_interval = config['key_interval']
+        
+        # How each capture step is performed (see ACTION_METHODS)
+        self.actions = config['actions']
+    
+    def step_position(self, step):
+        """Calibrated screen position for a capture step"""
+        return self.ok_pos if step == 'ok' else self.live_pos
+    
+    def perform(self, step, action=None):
+        """
+        Perform a capture step ('ok' or 'live_image') without waiting
+        
+        Args:
+            step: Capture step name
+            action: Action dict to use instead of the configured one
+        """
+        action = action or self.actions[step]
+        method = action['method']
+        
+        if method == 'hotkey':
+            log.debug("%s: hotkey %s", step, "+".join(action['keys']))
+            pyautogui.hotkey(*action['keys'])
+            return
+        
+        x, y = self.step_position(step)
+        log.debug("%s: click at (%s, %s)", step, x, y)
+        pyautogui.click(x, y)
+    
+    RESPONSE_BOX = 40     # pixels watched around a button for the Viewer's reaction
+    HOVER_SETTLE = 0.15   # let a button finish its hover repaint before the "before" shot
+    RESPONSE_POLLS = 3    # a change must last this many polls (not a pressed-button flash)
+    
+    def response_region(self, step):
+        """
+        Screen region that changes once the Viewer has handled a step
+        
+        OK closes the save dialog, so the area around the OK button changes;
+        Live Image restarts the live view (live_view_region if set).
+        """
+        region = self.config.get('live_view_region')
+        if step == 'live_image' and region:
+            return tuple(region)
+        x, y = self.step_position(step)
+        half = self.RESPONSE_BOX // 2
+        return (max(0, x - half), max(0, y - half), self.RESPONSE_BOX, self.RESPONSE_BOX)
+    
+    def timed_perform(self, step, action=None, timeout=5.0, poll=0.02):
+        """
+        Perform a capture step and wait until the Viewer visibly responds
+        
+        For a click the pointer is moved onto the button first, so the
+        button's own hover repaint is already in the "before" screenshot.
+        Only a change that lasts RESPONSE_POLLS polls counts, so the
+        button flashing pressed and back isn't taken for the Viewer.
+        
+        Returns:
+            Seconds from the end of the action (where the step's delay
+            starts) until its response region changed, or None if nothing
+            changed within timeout
+        """
+        action = action or self.actions[step]
+        if action['method'] == 'click':
+            pyautogui.moveTo(*self.step_position(step))
+            time.sleep(self.HOVER_SETTLE)
+        
+        region = self.response_region(step)
+        before = pyautogui.screenshot(region=region).tobytes()
+        self.perform(step, action)
+        acted = time.perf_counter()
+        changed_at = None
+        polls = 0
+        while time.perf_counter() - acted < timeout:
+            if pyautogui.screenshot(region=region).tobytes() != before:
+                if changed_at is None:
+                    changed_at = time.perf_counter()
+                polls += 1
+                if polls >= self.RESPONSE_POLLS:
+                    return changed_at - acted
+            else:
+                changed_at = None
+                polls = 0
+            time.sleep(poll)
+        return None
     
     def click_ok(self):
-        """Click the OK button"""
-        pyautogui.click(self.ok_pos[0], self.ok_pos[1])
+        """Close the save dialog (OK button or its configured action)"""
+        self.perform('ok')
         time.sleep(self.ok_delay)
     
     def click_live_image(self):
-        """Click the Live Image button"""
-        pyautogui.click(self.live_pos[0], self.live_pos[1])
+        """Return to live view (Live Image button or its configured action)"""
+        self.perform('live_image')
         time.sleep(self.live_delay)
     
-    def move_stage(self, direction, log_callback=None):
-        """Move stage with arrow keys"""
-        arrow_keys = {
-            'right': 'right',
-            'left': 'left',
-            'down': 'down',
-            'up': 'up'
-        }
+    ARROW_KEYS = {
+        'right': 'right',
+        'left': 'left',
+        'down': 'down',
+        'up': 'up'
+    }
+    
+    def move_stage(self, direction, log_callback=None, move_class='same'):
+        """Move stage with arrow keys, then wait the settle time for move_class"""
+        log.debug("Pressing %s arrow (%s)", direction, move_class)
         if log_callback:
             log_callback(f"    → Pressing {direction} arrow")
-        pyautogui.press(arrow_keys[direction])
-        time.sleep(self.arrow_delay)
+        pyautogui.press(self.ARROW_KEYS[direction])
+        time.sleep(self.settle_delays[move_class])
         if log_callback:
             log_callback(f"    ✓ {direction.upper()} key pressed")
     
+    def move(self, directions, move_class='same', log_callback=None):
+        """
+        Move stage through a batch of arrow presses, settling once at the end
+        
+        Runs of the same key are sent as one pyautogui.press call spaced by
+        key_interval (pyautogui waits the interval after every key, the
+        last one included), so a raster return stroke costs one settle,
+        not one per step.
+        """
+        if len(directions) == 1:
+            self.move_stage(directions[0], log_callback, move_class)
+            return
+        
+        for direction, count in GridNavigator.key_runs(directions):
+            key = self.ARROW_KEYS[direction]
+            log.debug("Pressing %s arrow x%d (%s)", key, count, move_class)
+            if log_callback:
+                log_callback(f"    → Pressing {key} arrow x{count}")
+            pyautogui.press(key, presses=count, interval=self.key_interval)
+        
+        time.sleep(self.settle_delays[move_class])
+    
+    def grab_live_view(self, region):
+        """Screenshot of the live view (region = [x, y, width, height])"""
+        return pyautogui.screenshot(region=tuple(region) if region else None)
+    
     def capture_sequence(self):
         """Execute full capture: wait -> OK -> Live Image"""
+        log.debug("Waiting %.2fs for capture", self.capture_delay)
         time.sleep(self.capture_delay)  # Wait for capture
         self.click_ok()                 # Close save dialog
         self.click_live_image()         # Return to live view
 
 
-# ==============================================================================
-# GRID NAVIGATOR
-# ==============================================================================
-
-class GridNavigator:
-    """Generates serpentine path through grid"""
-    
-    def __init__(self, width, height):
-        self.width = width
-        self.height = height
-        self.total = width * height
-    
-    def get_path(self):
-        """
-        Generate serpentine path
-        
-        Example 3x3:
-        (0,0) -> (0,1) -> (0,2)
-                           |
-        (1,2) <- (1,1) <- (1,0)
-          |
-        (2,0) -> (2,1) -> (2,2)
-        """
-        path = []
-        
-        for row in range(self.height):
-            if row % 2 == 0:
-                # Even rows: left to right
-                for col in range(self.width):
-                    path.append((row, col))
-            else:
-                # Odd rows: right to left
-                for col in range(self.width - 1, -1, -1):
-                    path.append((row, col))
-        
-        return path
-    
-    def get_movement(self, current_pos, next_pos):
-        """Calculate movement direction between two positions"""
-        curr_row, curr_col = current_pos
-        next_row, next_col = next_pos
-        
-        if next_row > curr_row:
-            return 'down'
-        elif next_col > curr_col:
-            return 'right'
-        elif next_col < curr_col:
-            return 'left'
-        else:
-            return 'right'
-
-
 # ==============================================================================
 # CALIBRATION WINDOW
 # ==============================================================================
@@ -175,7 +214,7 @@ class CalibrationWindow:
         self.parent = parent_app
         self.window = tk.Toplevel(parent_app.root)
         self.window.title("Button Calibration")
-        self.window.geometry("500x500")
+        self.window.geometry("500x580")
         self.window.grab_set()  # Make modal
         
         self.setup_ui()
@@ -222,6 +261,18 @@ class CalibrationWindow:
             command=lambda: self.calibrate('live_image_button')
         ).pack(pady=10)
         
+        # Optional: hotkey vs click speed tuning
+        tk.Button(
+            self.window,
+            text="3. Tune Capture Actions (optional)",
+            font=("Arial", 10),
+            bg="#95a5a6",
+            fg="white",
+            padx=20,
+            pady=10,
+            command=self.open_action_tuning
+        ).pack(pady=5)
+        
         # Status
         status_frame = tk.LabelFrame(self.window, text="Status", padx=20, pady=15)
         status_frame.pack(padx=20, pady=20, fill="both", expand=True)
@@ -282,6 +333,13 @@ class CalibrationWindow:
             pos = self.parent.config.data['live_image_button']
             self.live_status.config(text=f"✓ Live Image: ({pos[0]}, {pos[1]})", fg="#27ae60")
     
+    def open_action_tuning(self):
+        """Open action tuning window (needs both buttons calibrated)"""
+        if not self.parent.config.is_calibrated():
+            messagebox.showerror("Incomplete", "Calibrate both buttons first.")
+            return
+        ActionTuningWindow(self.parent)
+    
     def save_and_close(self):
         """Save calibration and close window"""
         if not self.parent.config.data.get('ok_button'):
@@ -311,7 +369,7 @@ class ArrowCalibrationWindow:
         self.window.geometry("600x600")
         self.window.grab_set()
         
-        self.controller = MicroscopeController(parent_app.config.data)
+        self.controller = MicroscopeController(parent_app.config.settings())
         self.setup_ui()
     
     def setup_ui(self):
@@ -471,6 +529,277 @@ class ArrowCalibrationWindow:
         self.log("")
 
 
+# ==============================================================================
+# ACTION TUNING WINDOW
+# ==============================================================================
+
+class ActionTuningWindow:
+    """
+    Window for measuring how fast the Viewer responds to each capture step
+    
+    Each variant is timed from the action until the step's response region
+    changes on screen (MicroscopeController.timed_perform). The fastest
+    reliable variant is saved, and the step's delay is set from its slowest
+    measured response.
+    """
+    
+    STEP_LABELS = {
+        'ok': "OK (close save dialog)",
+        'live_image': "Live Image (return to live view)"
+    }
+    DELAY_KEYS = {'ok': 'ok_delay', 'live_image': 'live_delay'}
+    RESPONSE_MARGIN = 1.5    # delay = slowest response x margin + padding
+    RESPONSE_PADDING = 0.05
+    
+    def __init__(self, parent_app):
+        self.parent = parent_app
+        self.window = tk.Toplevel(parent_app.root)
+        self.window.title("Capture Action Tuning")
+        self.window.geometry("600x600")
+        self.window.grab_set()
+        
+        self.controller = MicroscopeController(parent_app.config.settings())
+        self.setup_ui()
+    
+    def setup_ui(self):
+        """Build tuning interface"""
+        # Title
+        tk.Label(
+            self.window,
+            text="Capture Action Tuning",
+            font=("Arial", 16, "bold")
+        ).pack(pady=20)
+        
+        # Instructions
+        instructions = [
+            "Each step is tried as a click and (if given) a hotkey.",
+            "Every variant runs a few capture sequences, timing how long the",
+            "Viewer takes to respond on screen; confirm whether they worked.",
+            "The fastest variant is saved, and the OK / Live Image delays are",
+            "set from the measured response. Set live_view_region for best results."
+        ]
+        
+        instr_frame = tk.Frame(self.window, bg="#ecf0f1", relief="ridge", bd=2)
+        instr_frame.pack(padx=20, pady=10, fill="x")
+        
+        for instruction in instructions:
+            tk.Label(
+                instr_frame,
+                text=f"• {instruction}",
+                font=("Arial", 10),
+                bg="#ecf0f1",
+                anchor="w",
+                justify="left"
+            ).pack(fill="x", padx=15, pady=3)
+        
+        # Hotkeys to try
+        keys_frame = tk.LabelFrame(self.window, text="Viewer Hotkeys (blank = don't try)", padx=20, pady=15)
+        keys_frame.pack(padx=20, pady=10, fill="x")
+        
+        self.hotkey_vars = {}
+        for step in ACTION_STEPS:
+            action = self.controller.actions[step]
+            default = "+".join(action['keys']) if action['method'] == 'hotkey' else ""
+            if step == 'ok' and not default:
+                default = "enter"
+            
+            row = tk.Frame(keys_frame)
+            row.pack(fill="x", pady=3)
+            tk.Label(row, text=self.STEP_LABELS[step], width=30, anchor="w").pack(side="left")
+            self.hotkey_vars[step] = tk.StringVar(value=default)
+            tk.Entry(row, textvariable=self.hotkey_vars[step], width=15).pack(side="left")
+        
+        trials_row = tk.Frame(keys_frame)
+        trials_row.pack(fill="x", pady=3)
+        tk.Label(trials_row, text="Trials per variant:", width=30, anchor="w").pack(side="left")
+        self.trials_var = tk.StringVar(value="3")
+        tk.Entry(trials_row, textvariable=self.trials_var, width=5).pack(side="left")
+        
+        tk.Button(
+            self.window,
+            text="Run Tuning",
+            font=("Arial", 10, "bold"),
+            bg="#e67e22",
+            fg="white",
+            padx=15,
+            pady=8,
+            command=self.run_tuning
+        ).pack(pady=10)
+        
+        # Log
+        log_frame = tk.LabelFrame(self.window, text="Results", padx=10, pady=10)
+        log_frame.pack(padx=20, pady=10, fill="both", expand=True)
+        
+        self.log_text = scrolledtext.ScrolledText(log_frame, height=8, font=("Courier", 9))
+        self.log_text.pack(fill="both", expand=True)
+        
+        tk.Button(
+            self.window,
+            text="Done",
+            font=("Arial", 11, "bold"),
+            bg="#27ae60",
+            fg="white",
+            padx=30,
+            pady=10,
+            command=self.window.destroy
+        ).pack(pady=10)
+    
+    def log(self, message):
+        """Add message to results"""
+        self.log_text.insert(tk.END, f"{message}\n")
+        self.log_text.see(tk.END)
+        self.window.update()
+    
+    def candidates(self, step):
+        """Action variants to try for a step"""
+        variants = [{"method": "click"}]
+        keys = [k.strip() for k in self.hotkey_vars[step].get().split("+") if k.strip()]
+        if keys:
+            variants.append({"method": "hotkey", "keys": keys})
+        return variants
+    
+    def describe(self, action):
+        """Short name for an action"""
+        if action['method'] == 'hotkey':
+            return f"hotkey {'+'.join(action['keys'])}"
+        return action['method']
+    
+    def time_variant(self, step, action, trials):
+        """
+        Run full capture sequences with one step replaced by action
+        
+        Returns:
+            List of Viewer response times of the replaced step, None for
+            trials where no response was seen
+        """
+        delays = {'ok': self.controller.ok_delay, 'live_image': self.controller.live_delay}
+        timings = []
+        
+        for _ in range(trials):
+            time.sleep(self.controller.capture_delay)
+            for s in ACTION_STEPS:
+                timeout = max(2.0, 4 * delays[s])
+                response = self.controller.timed_perform(
+                    s, action if s == step else None, timeout
+                )
+                if s == step:
+                    timings.append(response)
+                if response is None:
+                    time.sleep(delays[s])
+            self.window.update()
+        
+        return timings
+    
+    def set_delay(self, step, seconds):
+        """Save a step's delay where the active settings take it from"""
+        key = self.DELAY_KEYS[step]
+        data = self.parent.config.data
+        profile = data.get("active_profile")
+        overrides = dict(BUILTIN_PROFILES.get(profile, {}))
+        overrides.update(data["profiles"].get(profile, {}))
+        
+        if profile and key in overrides:
+            data["profiles"].setdefault(profile, {})[key] = seconds
+        else:
+            data[key] = seconds
+        setattr(self.controller, key, seconds)
+    
+    def run_tuning(self):
+        """Measure every variant; save the fastest reliable one and its delay"""
+        try:
+            trials = max(1, int(self.trials_var.get()))
+        except ValueError:
+            trials = 3
+        
+        try:
+            pyautogui.screenshot(region=(0, 0, 1, 1))
+        except Exception as e:
+            messagebox.showerror(
+                "Error",
+                f"Cannot read the screen to time the Viewer ({e}).\n"
+                "Install Pillow: pip install pillow"
+            )
+            return
+        
+        chosen = dict(self.controller.actions)
+        
+        for step in ACTION_STEPS:
+            results = []
+            for action in self.candidates(step):
+                name = self.describe(action)
+                if not messagebox.askokcancel(
+                    "Ready?",
+                    f"Testing {self.STEP_LABELS[step]} as {name}.\n\n"
+                    f"{trials} capture sequences will run. Prepare the Viewer\n"
+                    "as for a normal scan, then click OK."
+                ):
+                    self.log(f"{step}: {name} skipped")
+                    continue
+                
+                timings = self.time_variant(step, action, trials)
+                measured = sorted(t for t in timings if t is not None)
+                if len(measured) < len(timings):
+                    self.log(f"{step}: {name:<15} no response seen in "
+                             f"{len(timings) - len(measured)} of {len(timings)} trials ✗")
+                    continue
+                
+                median = measured[len(measured) // 2]
+                worked = messagebox.askyesno(
+                    "Did it work?",
+                    f"Did the Viewer respond correctly to every {name} trial?"
+                )
+                self.log(f"{step}: {name:<15} {median * 1000:7.1f} ms "
+                         f"(max {measured[-1] * 1000:.0f}) {'✓' if worked else '✗ unreliable'}")
+                if worked:
+                    results.append((median, measured[-1], action))
+            
+            if results:
+                median, slowest, action = min(results, key=lambda r: r[0])
+                chosen[step] = action
+                delay = round(slowest * self.RESPONSE_MARGIN + self.RESPONSE_PADDING, 2)
+                self.set_delay(step, delay)
+                self.log(f"{step}: using {self.describe(action)}, "
+                         f"{self.DELAY_KEYS[step]} = {delay:.2f}s")
+        
+        self.parent.config.data['actions'] = chosen
+        self.parent.config.save()
+        self.controller.actions = chosen
+        self.log("Saved.")
+
+
+# ==============================================================================
+# OVERVIEW WINDOW
+# ==============================================================================
+
+class OverviewWindow:
+    """Live low-resolution mosaic of the tiles captured so far"""
+    
+    def __init__(self, parent_app, mosaic, fps):
+        self.mosaic = mosaic
+        self.interval_ms = max(1, int(1000 / fps))
+        self.window = tk.Toplevel(parent_app.root)
+        self.window.title("Scan Overview")
+        
+        width = mosaic.cols * mosaic.thumb
+        height = mosaic.rows * mosaic.thumb
+        self.canvas = tk.Canvas(self.window, width=width, height=height, bg="black")
+        self.canvas.pack(padx=10, pady=10)
+        self.photo = tk.PhotoImage(width=width, height=height)
+        self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
+        
+        self.refresh()
+    
+    def refresh(self):
+        """Redraw only the region changed since the last frame (capped rate)"""
+        if not self.window.winfo_exists():
+            return
+        changed = self.mosaic.take_dirty()
+        if changed:
+            x0, y0, pixels = changed
+            self.photo.put(overview.photo_rows(pixels), to=(x0, y0))
+        self.window.after(self.interval_ms, self.refresh)
+
+
 # ==============================================================================
 # MAIN APPLICATION
 # ==============================================================================
@@ -478,6 +807,9 @@ class ArrowCalibrationWindow:
 class MicroscopeApp:
     """Main application window"""
     
+    NO_PROFILE = "(config.json delays)"
+    LOG_POLL_MS = 200
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Bz-x800 Microscope Automation")
@@ -485,6 +817,16 @@ class MicroscopeApp:
         
         # Load configuration
         self.config = Config()
+        self.latency = LatencyProfile()
+        
+        # Logging: full record on disk, sampled view in the log box
+        settings = self.config.settings()
+        self.events = EventLog(
+            settings['log_file'],
+            settings['log_level'],
+            settings['ui_log_level'],
+            settings['ui_debug_sample']
+        )
         
         # State
         self.running = False
@@ -493,9 +835,19 @@ class MicroscopeApp:
         # Build UI
         self.setup_ui()
         
+        # Report config problems instead of silently using defaults
+        if self.config.errors:
+            messagebox.showwarning(
+                "Config Problems",
+                "Some settings in config.json were invalid and defaults were used:\n\n" +
+                "\n".join(self.config.errors)
+            )
+        
         # Check calibration
         if not self.config.is_calibrated():
             self.show_calibration_prompt()
+        
+        self.poll_log()
     
     def setup_ui(self):
         """Build the user interface"""
@@ -550,6 +902,19 @@ class MicroscopeApp:
         self.height_var = tk.StringVar(value="8")
         tk.Entry(height_row, textvariable=self.height_var, font=("Arial", 12), width=10).pack(side="left")
         
+        # Timing profile
+        profile_row = tk.Frame(grid_frame)
+        profile_row.pack(fill="x", pady=5)
+        tk.Label(profile_row, text="Profile:", width=15, anchor="w").pack(side="left")
+        self.profile_var = tk.StringVar(value=self.config.data.get('active_profile') or self.NO_PROFILE)
+        tk.OptionMenu(
+            profile_row,
+            self.profile_var,
+            self.NO_PROFILE,
+            *self.config.profile_names(),
+            command=self.select_profile
+        ).pack(side="left")
+        
         # Total
         self.total_label = tk.Label(grid_frame, text="Total: 40", font=("Arial", 10, "bold"))
         self.total_label.pack(pady=10)
@@ -649,12 +1014,18 @@ class MicroscopeApp:
         except:
             self.total_label.config(text="Total: --")
     
-    def log(self, message):
-        """Add message to log"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update()
+    def poll_log(self):
+        """Copy new log lines into the log box (runs on the Tk thread)"""
+        lines = self.events.ui.drain()
+        if lines:
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            self.log_text.see(tk.END)
+        self.root.after(self.LOG_POLL_MS, self.poll_log)
+    
+    def select_profile(self, name):
+        """Switch timing profile and save it as the default"""
+        self.config.set_profile(None if name == self.NO_PROFILE else name)
+        self.config.save()
     
     def show_calibration_prompt(self):
         """Prompt user to calibrate"""
@@ -719,79 +1090,273 @@ class MicroscopeApp:
         self.stop_requested = False
         self.log_text.delete(1.0, tk.END)
         
+        # Live overview (built here: Tk windows belong to this thread)
+        mosaic = self.open_overview(width, height)
+        
         # Run in thread
-        thread = threading.Thread(target=self.run_automation, args=(width, height), daemon=True)
+        thread = threading.Thread(target=self.run_automation, args=(width, height, mosaic), daemon=True)
         thread.start()
     
-    def run_automation(self, width, height):
+    def open_overview(self, width, height):
+        """Create the overview mosaic and its window if enabled"""
+        settings = self.config.settings()
+        if settings['overview_source'] == 'off':
+            return None
+        if not overview.available():
+            log.warning("Overview needs numpy and Pillow (pip install numpy pillow)")
+            return None
+        if settings['overview_source'] == 'file' and not settings['output_dir']:
+            log.warning("Overview from files needs output_dir set in config.json")
+            return None
+        
+        mosaic = overview.OverviewMosaic.fit(height, width, bit_depth=settings['bit_depth'])
+        OverviewWindow(self, mosaic, settings['overview_fps'])
+        return mosaic
+    
+    def run_automation(self, width, height, mosaic=None):
         """Main automation loop"""
-        self.log("=== STARTED ===")
-        self.log(f"Grid: {width} × {height}")
+        log.info("=== STARTED ===")
+        log.info("Grid: %d × %d", width, height)
         
         # Initialize
-        controller = MicroscopeController(self.config.data)
-        navigator = GridNavigator(width, height)
-        path = navigator.get_path()
+        settings = self.config.settings()
+        controller = MicroscopeController(settings)
+        
+        adaptive = settings['scan_mode'] == 'adaptive'
+        if adaptive and not mosaic:
+            log.warning("Adaptive scan needs the overview for scoring; scanning every tile")
+            adaptive = False
+        
+        if adaptive:
+            planner = AdaptiveGridPlanner(width, height, settings['coarse_step'])
+            moves = planner.coarse_moves()
+            log.info("Adaptive: coarse pass every %d tiles", planner.step)
+        else:
+            pattern = settings['scan_pattern']
+            if pattern == 'auto':
+                pattern = GridNavigator.fastest_pattern(width, height, settings)
+            navigator = GridNavigator(width, height, pattern)
+            moves = navigator.get_moves()
+            log.info("Pattern: %s", pattern)
         
         start_time = time.time()
         captured = 0
         
+        compressor = self.start_compressor(settings)
+        watcher = self.start_watcher(settings, mosaic, compressor)
+        
+        profiler = None
+        if settings['profiling']:
+            profiler = SamplingProfiler(threading.get_ident(), settings['profile_interval'])
+            profiler.start()
+        
         try:
-            for i, pos in enumerate(path):
-                if self.stop_requested:
-                    self.log("STOPPED by user")
-                    break
-                
-                row, col = pos
-                
-                # Update UI
-                progress = (i + 1) / navigator.total * 100
-                self.progress_var.set(progress)
-                self.progress_text.config(text=f"{i + 1} / {navigator.total}")
-                self.status_label.config(text=f"Row {row}, Col {col}")
-                
-                self.log(f"[{i+1}/{navigator.total}] Row {row}, Col {col}")
-                
-                # Move (skip first position)
-                if i > 0:
-                    movement = navigator.get_movement(path[i-1], pos)
-                    self.log(f"  Moving {movement}...")
-                    controller.move_stage(movement, log_callback=self.log)
-                
-                # Capture
-                self.log(f"  Capturing...")
-                controller.capture_sequence()
-                captured += 1
+            captured, stopped = self.run_moves(controller, moves, mosaic, watcher)
+            
+            if adaptive and not stopped:
+                # Score the coarse tiles once their thumbnails are in
+                if watcher:
+                    watcher.wait()
+                mosaic.wait()
+                scores = {pos: mosaic.score(*pos) for pos in planner.coarse_positions()}
+                targets = planner.refine_targets(scores, controller.config['content_threshold'])
+                moves = planner.refine_moves(moves[-1][0], targets, planner.last_x(moves))
+                log.info("Adaptive: refining %d of %d remaining tiles",
+                         len(targets), width * height - captured)
+                refined, stopped = self.run_moves(controller, moves, mosaic, watcher)
+                captured += refined
             
             # Done
             elapsed = time.time() - start_time
-            self.log("=== COMPLETED ===")
-            self.log(f"Captured: {captured}")
-            self.log(f"Time: {elapsed/60:.1f} min")
+            log.info("=== COMPLETED ===")
+            log.info("Captured: %d", captured)
+            log.info("Time: %.1f min", elapsed / 60)
             
             self.status_label.config(text="✓ Complete!")
             messagebox.showinfo("Complete", f"Captured {captured} images!")
             
         except Exception as e:
-            self.log(f"ERROR: {e}")
+            log.exception("ERROR: %s", e)
             self.status_label.config(text="✗ Error")
             messagebox.showerror("Error", str(e))
         
         finally:
+            self.latency.save()
+            if watcher:
+                watcher.close()
+            if mosaic:
+                mosaic.close()
+            if compressor:
+                self.finish_compressor(compressor)
+            if profiler:
+                self.write_profile(profiler)
             self.running = False
             self.start_button.config(state="normal")
             self.stop_button.config(state="disabled")
     
+    def run_moves(self, controller, moves, mosaic=None, watcher=None):
+        """
+        Move and capture through a list of (position, directions, move_class)
+        
+        Returns:
+            (captured, stopped)
+        """
+        captured = 0
+        total = len(moves)
+        predicted, left = self.predict_moves(controller.config, moves)
+        
+        for i, (pos, directions, move_class) in enumerate(moves):
+            if self.stop_requested:
+                log.info("STOPPED by user")
+                return captured, True
+            
+            row, col = pos
+            
+            # Pick up config.json edits between tiles
+            if self.config.reload_if_changed():
+                settings = self.config.settings()
+                controller.apply_settings(settings)
+                predicted, left = self.predict_moves(settings, moves)
+                self.events.set_levels(
+                    settings['log_level'],
+                    settings['ui_log_level'],
+                    settings['ui_debug_sample']
+                )
+                log.info("Config reloaded")
+            if self.config.errors:
+                log.warning("Config problems: %s", "; ".join(self.config.errors))
+                self.config.errors = []
+            
+            # Update UI
+            remaining = left[i] + (total - i) * self.latency.tile_overhead
+            progress = (i + 1) / total * 100
+            self.progress_var.set(progress)
+            self.progress_text.config(text=f"{i + 1} / {total}")
+            self.status_label.config(text=f"Row {row}, Col {col} (~{remaining / 60:.0f} min left)")
+            
+            log.info("[%d/%d] Row %d, Col %d", i + 1, total, row, col)
+            
+            # Move (skip first position)
+            move_start = time.perf_counter()
+            if directions:
+                controller.move(directions, move_class)
+            
+            # Capture
+            tile_start = time.time()
+            controller.capture_sequence()
+            captured += 1
+            
+            if mosaic or watcher:
+                self.handle_saved_tile(controller, pos, tile_start, mosaic, watcher)
+            
+            # Learn how far real tiles run over the configured delays
+            self.latency.record(time.perf_counter() - move_start, predicted[i])
+        
+        return captured, False
+    
+    @staticmethod
+    def predict_moves(settings, moves):
+        """
+        Configured time of each tile in a pass, and of the rest of the pass
+        
+        Returns:
+            (predicted, left) - left[i] is the sum of predicted[i:]
+        """
+        predicted = [predicted_tile_seconds(settings, directions, move_class)
+                     for pos, directions, move_class in moves]
+        left = list(accumulate(reversed(predicted)))[::-1]
+        return predicted, left
+    
+    def handle_saved_tile(self, controller, pos, tile_start, mosaic, watcher):
+        """Hand the tile just captured to the overview and/or the file watcher"""
+        settings = controller.config
+        row, col = pos
+        
+        if mosaic and settings['overview_source'] == 'screen':
+            mosaic.submit(row, col, controller.grab_live_view(settings['live_view_region']))
+        
+        if watcher:
+            watcher.submit(row, col, tile_start)
+    
+    def start_watcher(self, settings, mosaic, compressor):
+        """Background search for each tile's saved file, if anything needs it"""
+        if settings['overview_source'] != 'file':
+            mosaic = None
+        if not mosaic and not compressor:
+            return None
+        
+        def deliver(row, col, path):
+            # Compress only after the overview has read the original
+            then = (lambda: compressor.submit(path, row, col)) if compressor else None
+            if not (mosaic and mosaic.submit(row, col, path, then)) and then:
+                then()
+        
+        return SavedTileWatcher(settings['output_dir'], deliver)
+    
+    def start_compressor(self, settings):
+        """Background compression pool for saved tiles, if enabled"""
+        mode = settings['compress']
+        if mode == 'off':
+            return None
+        if not settings['output_dir']:
+            log.warning("Compression needs output_dir set in config.json")
+            return None
+        if not postprocess.available(mode):
+            log.warning("Compression to %s needs Pillow (pip install pillow)", mode)
+            return None
+        
+        log.info("Compressing saved tiles (%s, %d workers)", mode, settings['compress_workers'])
+        return postprocess.TileCompressor(
+            settings['output_dir'],
+            mode,
+            settings['compress_workers'],
+            settings['compress_queue'],
+            settings['compress_chunk']
+        )
+    
+    def finish_compressor(self, compressor):
+        """Wait for compression to finish and log the savings"""
+        self.status_label.config(text="Finishing compression...")
+        stats = compressor.close()
+        log.info(
+            "Compressed %d tiles: %.1f MB → %.1f MB (saved %.1f MB, %.1f MB/s per worker)%s",
+            stats['files'],
+            stats['bytes_in'] / 1e6,
+            stats['bytes_out'] / 1e6,
+            stats['bytes_saved'] / 1e6,
+            stats['mb_per_second'],
+            f", {stats['failed']} failed" if stats['failed'] else ""
+        )
+        if stats['deferred']:
+            log.info("%d tiles waited for a free compression worker (at most %d at once)",
+                     stats['deferred'], stats['max_overflow'])
+    
+    def write_profile(self, profiler):
+        """Stop the profiler, log its summary and save the folded stacks"""
+        report = profiler.stop()
+        for line in format_report(report):
+            log.info("%s", line)
+        
+        if report['pyautogui_pause'] and report['pause_seconds'] > 0:
+            log.warning(
+                "pyautogui.PAUSE = %ss added %.1fs after clicks/presses",
+                report['pyautogui_pause'], report['pause_seconds']
+            )
+        
+        path = profiler.write_folded(f"profile_{datetime.now():%Y%m%d_%H%M%S}.folded")
+        log.info("Flamegraph stacks: %s", path)
+    
     def stop(self):
         """Request stop"""
         if self.running:
             self.stop_requested = True
-            self.log("Stop requested...")
+            log.info("Stop requested...")
             self.stop_button.config(state="disabled")
     
     def run(self):
         """Start the application"""
         self.root.mainloop()
+        self.events.close()
 
 
 # ==============================================================================
@@ -0,0 +1,632 @@
+"""
+Multi-instrument orchestration - one headless worker per acquisition PC,
+driven over HTTP by a single coordinator
+
+Run a worker on each BZ-X800 PC (next to its config.json):
+    python orchestration.py worker --host 0.0.0.0 --port 8801 --token SECRET
+
+Run the coordinator anywhere that can reach them:
+    python orchestration.py coordinator --worker http://pc1:8801 \\
+        --worker http://pc2:8801 --jobs jobs.json --token SECRET
+
+A worker drives its PC's mouse, keyboard and stage, so it only listens on
+localhost unless given a shared token (or BZX800_TOKEN), which every
+request must then carry in an X-Auth-Token header.
+
+Try it on one machine with stub workers (no microscope, no mouse/keyboard):
+    python orchestration.py worker --port 8801 --stub
+    python orchestration.py worker --port 8802 --stub
+    python orchestration.py coordinator --worker http://127.0.0.1:8801 \\
+        --worker http://127.0.0.1:8802 --jobs jobs.json
+
+jobs.json is a list of scan jobs:
+    [{"id": "slide-1", "width": 5, "height": 8, "profile": "fast 10x"}, ...]
+"""
+
+import argparse
+import hmac
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from config import Config
+from event_log import EventLog, log
+from grid_navigator import GridNavigator
+from scheduler import (POLICIES, LatencyProfile, Scheduler, check_job, format_plan,
+                       predicted_tile_seconds)
+
+
+# ==============================================================================
+# STUB CONTROLLER
+# ==============================================================================
+
+class StubController:
+    """
+    Stand-in for MicroscopeController that only sleeps
+
+    Same interface as the real controller, so workers can be exercised
+    without a microscope. Delays are multiplied by `speed` (0 = instant).
+    """
+
+    def __init__(self, config, speed=0.1):
+        self.speed = speed
+        self.moves = 0
+        self.captures = 0
+        self.apply_settings(config)
+
+    def apply_settings(self, config):
+        """Take delays from a settings dict"""
+        self.config = config
+        self.capture_delay = config['capture_delay']
+        self.ok_delay = config['ok_delay']
+        self.live_delay = config['live_delay']
+        self.arrow_delay = config['arrow_delay']
+        self.settle_delays = {
+            'same': config['arrow_delay'],
+            'reversal': config['reversal_delay'],
+            'row_change': config['row_change_delay']
+        }
+        self.key_interval = config['key_interval']
+
+    def move_stage(self, direction, log_callback=None, move_class='same'):
+        """Pretend to press an arrow key"""
+        self.move([direction], move_class)
+
+    def move(self, directions, move_class='same', log_callback=None):
+        """Pretend to press a batch of arrow keys"""
+        batch = len(directions) * self.key_interval if len(directions) > 1 else 0.0
+        time.sleep((batch + self.settle_delays[move_class]) * self.speed)
+        self.moves += len(directions)
+
+    def capture_sequence(self):
+        """Pretend to capture: wait -> OK -> Live Image"""
+        time.sleep((self.capture_delay + self.ok_delay + self.live_delay) * self.speed)
+        self.captures += 1
+
+
+# ==============================================================================
+# WORKER
+# ==============================================================================
+
+class ScanWorker:
+    """
+    Headless scan runner for one station
+
+    Jobs are queued and run one at a time on a background thread. Progress
+    is published as numbered events so a coordinator can poll for anything
+    it has not seen yet.
+    """
+
+    MAX_EVENTS = 1000
+
+    def __init__(self, name, config_file="config.json", stub=False, stub_speed=0.1):
+        self.name = name
+        self.config = Config(config_file)
+        self.latency = LatencyProfile()
+        self.stub = stub
+        self.stub_speed = stub_speed
+
+        self.jobs = queue.Queue()
+        self.queued_ids = deque()
+        self.current = None
+        self.completed = []
+        self.stop_requested = False
+
+        self.events = deque(maxlen=self.MAX_EVENTS)
+        self.event_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+        # Telemetry
+        self.started = time.time()
+        self.tiles_done = 0
+        self.busy_seconds = 0.0
+        self.last_tile_seconds = None
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def emit(self, kind, **fields):
+        """Record a progress event"""
+        with self.lock:
+            event = {"seq": next(self.event_ids), "time": time.time(), "kind": kind}
+            event.update(fields)
+            self.events.append(event)
+
+    def events_since(self, seq):
+        """Events with a sequence number greater than seq"""
+        with self.lock:
+            return [e for e in self.events if e["seq"] > seq]
+
+    def submit(self, job):
+        """
+        Queue a scan job
+
+        Args:
+            job: dict with width, height and optional id, profile
+
+        Returns:
+            The normalised job dict
+        """
+        width, height, profile = check_job(job, self.config.profile_names())
+
+        job = {
+            "id": str(job.get("id") or f"{self.name}-{int(time.time() * 1000)}"),
+            "width": width,
+            "height": height,
+            "profile": profile
+        }
+        with self.lock:
+            self.queued_ids.append(job["id"])
+        self.jobs.put(job)
+        self.emit("queued", job=job["id"])
+        return job
+
+    def stop(self):
+        """Stop the current job (queued jobs still run)"""
+        self.stop_requested = True
+
+    def status(self):
+        """Snapshot of worker state and telemetry"""
+        with self.lock:
+            uptime = time.time() - self.started
+            return {
+                "station": self.name,
+                "stub": self.stub,
+                "state": "scanning" if self.current else "idle",
+                "current": dict(self.current) if self.current else None,
+                "queued": list(self.queued_ids),
+                "completed": list(self.completed),
+                "telemetry": {
+                    "tiles_done": self.tiles_done,
+                    "busy_seconds": round(self.busy_seconds, 1),
+                    "utilisation": round(self.busy_seconds / uptime, 3) if uptime else 0.0,
+                    "tiles_per_minute": (
+                        round(self.tiles_done / self.busy_seconds * 60, 2)
+                        if self.busy_seconds else 0.0
+                    ),
+                    "last_tile_seconds": self.last_tile_seconds
+                },
+                "last_event": self.events[-1]["seq"] if self.events else 0
+            }
+
+    def run(self):
+        """Job loop (background thread)"""
+        while True:
+            job = self.jobs.get()
+            with self.lock:
+                self.queued_ids.remove(job["id"])
+                self.current = dict(job, index=0, total=job["width"] * job["height"])
+            self.stop_requested = False
+
+            start_time = time.time()
+            try:
+                result = self.run_job(job)
+            except Exception as e:
+                result = "error"
+                log.exception("Job %s failed: %s", job["id"], e)
+                self.emit("error", job=job["id"], message=str(e))
+
+            elapsed = time.time() - start_time
+            if not self.stub:
+                self.latency.save()
+            with self.lock:
+                self.busy_seconds += elapsed
+                self.completed.append({"id": job["id"], "result": result,
+                                       "seconds": round(elapsed, 1)})
+                self.current = None
+            self.emit("finished", job=job["id"], result=result, seconds=round(elapsed, 1))
+
+    def run_job(self, job):
+        """
+        Run one scan headlessly (same sequence as MicroscopeApp.run_automation)
+
+        Returns:
+            'completed' or 'stopped'
+        """
+        # The job's profile applies to this job only, never to the shared config
+        self.config.reload_if_changed()
+        settings = self.config.settings(job["profile"])
+        if self.stub:
+            controller = StubController(settings, speed=self.stub_speed)
+        else:
+            if not self.config.is_calibrated():
+                raise RuntimeError("Buttons not calibrated on this station")
+            # Only real scans need pyautogui (and a display), so import here
+            from main import MicroscopeController
+            controller = MicroscopeController(settings)
+
+        pattern = settings['scan_pattern']
+        if pattern == 'auto':
+            pattern = GridNavigator.fastest_pattern(job["width"], job["height"], settings)
+        navigator = GridNavigator(job["width"], job["height"], pattern)
+        log.info("Job %s started: %d × %d, %s", job["id"], job["width"], job["height"], pattern)
+        self.emit("started", job=job["id"], total=navigator.total, pattern=pattern)
+
+        for i, (pos, directions, move_class) in enumerate(navigator.get_moves()):
+            if self.stop_requested:
+                self.emit("stopped", job=job["id"], index=i)
+                return "stopped"
+
+            # Pick up config.json edits between tiles
+            if self.config.reload_if_changed():
+                settings = self.config.settings(job["profile"])
+                controller.apply_settings(settings)
+                self.emit("config_reloaded", job=job["id"])
+
+            tile_start = time.time()
+            if directions:
+                controller.move(directions, move_class)
+            controller.capture_sequence()
+            tile_seconds = time.time() - tile_start
+            predicted = predicted_tile_seconds(settings, directions, move_class)
+            timing = {}
+            if not self.stub:
+                # Stub tiles take stub_speed x the delays: useless for learning
+                self.latency.record(tile_seconds, predicted)
+                timing["predicted"] = round(predicted, 3)
+
+            log.info("[%d/%d] Row %d, Col %d", i + 1, navigator.total, pos[0], pos[1])
+            with self.lock:
+                self.tiles_done += 1
+                self.last_tile_seconds = round(tile_seconds, 3)
+                self.current["index"] = i + 1
+            self.emit("tile", job=job["id"], index=i + 1, total=navigator.total,
+                      row=pos[0], col=pos[1], seconds=round(tile_seconds, 3), **timing)
+
+        return "completed"
+
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API for a ScanWorker
+
+    GET  /status           worker state and telemetry
+    GET  /events?since=N   progress events after sequence number N
+    POST /jobs             queue a job (JSON body)
+    POST /stop             stop the current job
+    """
+
+    worker = None  # set by serve_worker
+    token = None
+
+    def authorized(self):
+        """Check the shared token (if the worker has one)"""
+        if not self.token:
+            return True
+        given = self.headers.get("X-Auth-Token", "")
+        if hmac.compare_digest(given.encode("utf-8"), self.token.encode("utf-8")):
+            return True
+        self.send_json({"error": "missing or wrong X-Auth-Token"}, 401)
+        return False
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        url = urlparse(self.path)
+        if url.path == "/status":
+            self.send_json(self.worker.status())
+        elif url.path == "/events":
+            try:
+                since = int(parse_qs(url.query).get("since", ["0"])[0])
+            except ValueError:
+                self.send_json({"error": "since must be an integer"}, 400)
+                return
+            self.send_json(self.worker.events_since(since))
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        url = urlparse(self.path)
+        if url.path == "/jobs":
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                job = json.loads(self.rfile.read(length) or b"{}")
+                self.send_json(self.worker.submit(job), 201)
+            except (KeyError, TypeError, ValueError) as e:
+                self.send_json({"error": str(e)}, 400)
+        elif url.path == "/stop":
+            self.worker.stop()
+            self.send_json({"stopping": True})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def log_message(self, format, *args):
+        """Keep polling requests out of the console"""
+        pass
+
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def serve_worker(worker, host="127.0.0.1", port=8801, token=None):
+    """
+    Create (but don't start) the HTTP server for a worker
+
+    Anyone who can reach the worker can drive this PC's mouse, keyboard
+    and stage, so listening beyond localhost requires a token.
+    """
+    if host not in LOCAL_HOSTS and not token:
+        raise ValueError(f"A token is required to listen on {host}")
+    handler = type("BoundWorkerRequestHandler", (WorkerRequestHandler,),
+                   {"worker": worker, "token": token})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# ==============================================================================
+# COORDINATOR
+# ==============================================================================
+
+def http_json(url, data=None, timeout=5, token=None):
+    """GET (or POST if data is given) a URL and decode the JSON reply"""
+    body = None if data is None else json.dumps(data).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["X-Auth-Token"] = token
+    request = Request(url, data=body, headers=headers)
+    with urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+class Coordinator:
+    """
+    Keeps every station's queue topped up and aggregates throughput
+
+    Jobs are handed out one at a time to the least-loaded station (idle
+    ones first) while it has room in its queue, so every station is kept
+    busy and faster stations naturally take more of the work.
+
+    With a scheduler and a policy other than 'fifo', pending jobs are
+    re-ordered before every hand-out. The plan covers all online stations
+    (from when each will be free), counts the window and deadlines from
+    the coordinator's start, and uses estimates refreshed from the
+    stations' tile timings.
+    """
+
+    def __init__(self, worker_urls, jobs, queue_depth=1, poll_interval=1.0, log=print,
+                 scheduler=None, policy="fifo", window_hours=None, token=None):
+        self.workers = {url.rstrip("/"): {"cursor": 0, "status": None, "online": False}
+                        for url in worker_urls}
+        self.pending = deque(jobs)
+        self.queue_depth = queue_depth
+        self.poll_interval = poll_interval
+        self.log = log
+        self.assigned = {}
+        self.sent = {}  # job id -> job as accepted by its worker
+        self.rejected = []
+        self.scheduler = scheduler
+        self.policy = policy
+        self.window_hours = window_hours
+        self.token = token
+        self.started = time.time()
+
+    def poll(self, url):
+        """Refresh one worker's status and print its new events"""
+        worker = self.workers[url]
+        try:
+            worker["status"] = http_json(f"{url}/status", token=self.token)
+            events = http_json(f"{url}/events?since={worker['cursor']}", token=self.token)
+        except (OSError, ValueError) as e:
+            if worker["online"]:
+                self.log(f"[{url}] offline: {e}")
+            worker["online"] = False
+            return
+
+        if not worker["online"]:
+            self.log(f"[{url}] online as {worker['status']['station']}")
+        worker["online"] = True
+
+        for event in events:
+            worker["cursor"] = event["seq"]
+            if event["kind"] == "tile" and self.scheduler and "predicted" in event:
+                self.scheduler.latency.record(event["seconds"], event["predicted"])
+            if event["kind"] != "tile":
+                self.log(f"[{worker['status']['station']}] {event['kind']}: "
+                         f"{event.get('job', '')} {event.get('result', '')}".rstrip())
+
+    def remaining_seconds(self, url):
+        """Estimated time until a worker has finished its current and queued jobs"""
+        status = self.workers[url]["status"]
+        seconds = 0.0
+        current = status["current"]
+        if current and current["id"] in self.sent:
+            done = current["index"] / current["total"] if current["total"] else 0.0
+            seconds += self.scheduler.estimate(self.sent[current["id"]]) * (1.0 - done)
+        for job_id in status["queued"]:
+            if job_id in self.sent:
+                seconds += self.scheduler.estimate(self.sent[job_id])
+        return seconds
+
+    def reorder(self):
+        """Re-plan pending jobs with the latest estimates"""
+        if not self.scheduler or self.policy == "fifo" or len(self.pending) < 2:
+            return
+        online = [url for url, worker in self.workers.items() if worker["online"]]
+        free_at = [self.remaining_seconds(url) for url in online] or [0.0]
+        elapsed = (time.time() - self.started) / 3600
+        schedule = self.scheduler.plan(list(self.pending), self.policy, self.window_hours,
+                                       free_at, elapsed)
+        self.pending = deque(entry["job"] for entry in schedule)
+
+    def load(self, url):
+        """Jobs running or queued on a worker"""
+        status = self.workers[url]["status"]
+        return len(status["queued"]) + (1 if status["current"] else 0)
+
+    def dispatch(self):
+        """
+        Hand pending jobs out one at a time, least-loaded station first
+
+        Every station is polled before this runs, so an idle station never
+        takes a second job while another one is still idle.
+        """
+        online = [url for url, worker in self.workers.items() if worker["online"]]
+        if not self.pending or not any(self.load(url) <= self.queue_depth for url in online):
+            return
+        self.reorder()
+
+        while self.pending and online:
+            url = min(online, key=self.load)
+            if self.load(url) > self.queue_depth:
+                return
+            if not self.send(url):
+                online.remove(url)
+
+    def send(self, url):
+        """
+        Send the next pending job to a worker
+
+        Returns:
+            False if the worker could not be reached
+        """
+        status = self.workers[url]["status"]
+        job = self.pending.popleft()
+        try:
+            accepted = http_json(f"{url}/jobs", job, token=self.token)
+        except HTTPError as e:
+            # The worker validated and refused the job - don't retry it
+            self.log(f"[{status['station']}] invalid job {job.get('id', job)}: "
+                     f"{e.read().decode('utf-8', 'replace')}")
+            self.rejected.append(job)
+            return True
+        except (OSError, ValueError) as e:
+            self.log(f"[{url}] rejected {job.get('id', job)}: {e}")
+            self.pending.appendleft(job)
+            return False
+        self.assigned[accepted["id"]] = status["station"]
+        self.sent[accepted["id"]] = accepted
+        status["queued"].append(accepted["id"])
+        self.log(f"[{status['station']}] assigned {accepted['id']}")
+        return True
+
+    def metrics(self):
+        """Aggregate throughput across online stations"""
+        stations = {}
+        for url, worker in self.workers.items():
+            if not worker["online"]:
+                continue
+            status = worker["status"]
+            stations[status["station"]] = status["telemetry"]
+
+        return {
+            "stations": stations,
+            "tiles_done": sum(t["tiles_done"] for t in stations.values()),
+            "tiles_per_minute": round(sum(t["tiles_per_minute"] for t in stations.values()), 2),
+            "pending_jobs": len(self.pending),
+            "rejected_jobs": len(self.rejected)
+        }
+
+    def busy(self):
+        """True while any job is pending, queued or running"""
+        if self.pending:
+            return True
+        for worker in self.workers.values():
+            status = worker["status"]
+            if worker["online"] and (status["current"] or status["queued"]):
+                return True
+        return False
+
+    def run(self, report_every=30.0):
+        """Poll workers until every job has finished"""
+        last_report = time.time()
+        while True:
+            for url in self.workers:
+                self.poll(url)
+            self.dispatch()
+
+            if time.time() - last_report >= report_every:
+                self.log(json.dumps(self.metrics()))
+                last_report = time.time()
+
+            if not self.busy():
+                break
+            time.sleep(self.poll_interval)
+
+        self.log(json.dumps(self.metrics()))
+
+
+# ==============================================================================
+# ENTRY POINT
+# ==============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Bz-x800 multi-station orchestration")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker_args = sub.add_parser("worker", help="run a headless station worker")
+    worker_args.add_argument("--host", default="127.0.0.1",
+                             help="address to listen on (non-local needs --token)")
+    worker_args.add_argument("--port", type=int, default=8801)
+    worker_args.add_argument("--name", default=socket.gethostname())
+    worker_args.add_argument("--config", default="config.json")
+    worker_args.add_argument("--stub", action="store_true",
+                             help="simulate the microscope (no mouse/keyboard)")
+    worker_args.add_argument("--stub-speed", type=float, default=0.1,
+                             help="stub delay multiplier (0 = instant)")
+    worker_args.add_argument("--token", default=os.environ.get("BZX800_TOKEN"),
+                             help="shared secret (default: BZX800_TOKEN)")
+
+    coord_args = sub.add_parser("coordinator", help="feed jobs to workers")
+    coord_args.add_argument("--worker", action="append", required=True,
+                            help="worker URL, e.g. http://pc1:8801 (repeatable)")
+    coord_args.add_argument("--jobs", required=True, help="JSON file with a list of jobs")
+    coord_args.add_argument("--queue-depth", type=int, default=1,
+                            help="jobs waiting on a station behind the running one")
+    coord_args.add_argument("--poll", type=float, default=1.0)
+    coord_args.add_argument("--order", choices=POLICIES, default="fifo",
+                            help="job order (see scheduler.py)")
+    coord_args.add_argument("--window", type=float, help="window length in hours")
+    coord_args.add_argument("--config", default="config.json",
+                            help="delays/profiles used for estimates")
+    coord_args.add_argument("--token", default=os.environ.get("BZX800_TOKEN"),
+                            help="shared secret (default: BZX800_TOKEN)")
+
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        if args.host not in LOCAL_HOSTS and not args.token:
+            parser.error(f"--token (or BZX800_TOKEN) is required to listen on {args.host}")
+        name = f"{args.name}-{args.port}" if args.stub else args.name
+        worker = ScanWorker(name, args.config, stub=args.stub, stub_speed=args.stub_speed)
+        settings = worker.config.settings()
+        events = EventLog(settings['log_file'], settings['log_level'], ui_level="ERROR")
+        server = serve_worker(worker, args.host, args.port, args.token)
+        print(f"Worker {name} listening on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            worker.stop()
+        events.close()
+    else:
+        with open(args.jobs, 'r') as f:
+            jobs = json.load(f)
+        scheduler = Scheduler(Config(args.config), LatencyProfile())
+        if args.order != "fifo":
+            stations = [0.0] * len(args.worker)
+            for line in format_plan(scheduler.plan(jobs, args.order, args.window, stations)):
+                print(line)
+        Coordinator(args.worker, jobs, args.queue_depth, args.poll,
+                    scheduler=scheduler, policy=args.order,
+                    window_hours=args.window, token=args.token).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Live overview mosaic - a low-resolution picture of the slide built while
+the scan runs
+
+Each tile is shrunk to a small grayscale thumbnail and written into a
+NumPy canvas at its grid (row, col). Decoding happens on a background
+thread so the capture loop only pays for a queue put. The UI asks for the
+changed region (take_dirty) and redraws just that part.
+
+Needs numpy; reading saved files or grabbing the screen needs Pillow.
+"""
+
+import queue
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from event_log import log
+
+QUEUE_SIZE = 64
+
+
+def available():
+    """True if the optional dependencies for the overview are installed"""
+    return np is not None and Image is not None
+
+
+def shrink(array, size):
+    """Resample a 2D array to size x size (block mean down, nearest up)"""
+    if array.shape[0] < size or array.shape[1] < size:
+        # Smaller than the thumbnail: nearest-neighbour upscale
+        ys = np.arange(size) * array.shape[0] // size
+        xs = np.arange(size) * array.shape[1] // size
+        return array[np.ix_(ys, xs)].astype(np.float64)
+
+    # Block-mean down to size x size (crop the remainder)
+    h_step = max(1, array.shape[0] // size)
+    w_step = max(1, array.shape[1] // size)
+    array = array[:h_step * size, :w_step * size]
+    return array.reshape(size, h_step, size, w_step).mean(axis=(1, 3))
+
+
+def thumbnail(image, size):
+    """
+    Shrink an image to a size x size grayscale thumbnail
+
+    Args:
+        image: PIL image or 2D/3D NumPy array
+        size: Thumbnail edge in pixels
+
+    Returns:
+        (pixels, content) - pixels is a uint8 array for display, with
+        12/16-bit data stretched to full contrast; content is (std,
+        eight_bit): the std of the unstretched thumbnail in the image's
+        own units, and whether those are 0-255
+    """
+    if Image is not None and isinstance(image, Image.Image):
+        if image.mode in ('L', 'P', 'RGB', 'RGBA'):
+            image.draft('L', (size * 4, size * 4))  # fast JPEG downscale on load
+            pixels = np.asarray(image.convert('L').resize((size, size), Image.BILINEAR))
+            return pixels, (float(pixels.std()), True)
+        # 16-bit / float: convert('L') would clip, so scale via NumPy below
+
+    array = np.asarray(image)
+    eight_bit = array.dtype == np.uint8
+    if array.ndim == 3:
+        array = array[..., :3].mean(axis=2)
+
+    values = shrink(array, size)
+    if eight_bit:
+        return values.astype(np.uint8), (float(values.std()), True)
+
+    # Stretch 12/16-bit microscope data to 8 bits, for display only
+    low, high = float(values.min()), float(values.max())
+    pixels = ((values - low) * (255.0 / (high - low or 1.0))).astype(np.uint8)
+    return pixels, (float(values.std()), False)
+
+
+class OverviewMosaic:
+    """
+    Grayscale canvas of tile thumbnails
+
+    Args:
+        rows: Grid height
+        cols: Grid width
+        thumb: Thumbnail edge in pixels
+        bit_depth: Significant bits of 12/16-bit tiles (their full scale)
+    """
+
+    def __init__(self, rows, cols, thumb=16, bit_depth=16):
+        self.rows = rows
+        self.cols = cols
+        self.thumb = thumb
+        self.full_scale = 2 ** bit_depth - 1
+        self.canvas = np.zeros((rows * thumb, cols * thumb), dtype=np.uint8)
+        self.dirty = None  # (x0, y0, x1, y1) in canvas pixels
+        self.content = {}  # (row, col) -> (std, eight_bit), see thumbnail
+        self.lock = threading.Lock()
+
+        self.jobs = queue.Queue(maxsize=QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.run, name="overview", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def fit(cls, rows, cols, max_width=480, max_height=480, bit_depth=16):
+        """Mosaic whose thumbnails make the whole canvas fit the given size"""
+        thumb = max(2, min(32, max_width // cols, max_height // rows))
+        return cls(rows, cols, thumb, bit_depth)
+
+    def submit(self, row, col, source, then=None):
+        """
+        Queue a tile for the overview without blocking
+
+        Args:
+            source: Path of the saved file, a PIL image or an array
+            then: Called on the overview thread once the tile has been
+                  read (e.g. to hand the file on for compression)
+
+        Returns:
+            False if the queue was full and the tile was skipped
+        """
+        try:
+            self.jobs.put_nowait((row, col, source, then))
+            return True
+        except queue.Full:
+            log.debug("Overview busy, skipped tile (%d, %d)", row, col)
+            return False
+
+    def wait(self):
+        """Block until every queued tile has been placed"""
+        self.jobs.join()
+
+    def close(self):
+        """Finish queued tiles and stop the background thread"""
+        self.jobs.put((None, None, None, None))
+        self.thread.join()
+
+    def run(self):
+        """Decode queued tiles (background thread)"""
+        while True:
+            row, col, source, then = self.jobs.get()
+            if row is None:
+                self.jobs.task_done()
+                return
+            try:
+                if isinstance(source, str) or hasattr(source, "__fspath__"):
+                    with Image.open(source) as image:
+                        thumb, content = thumbnail(image, self.thumb)
+                else:
+                    thumb, content = thumbnail(source, self.thumb)
+                self.place(row, col, thumb, content)
+            except Exception as e:
+                log.warning("Overview could not read tile (%d, %d): %s", row, col, e)
+            finally:
+                if then:
+                    then()
+                self.jobs.task_done()
+
+    def place(self, row, col, thumb, content=None):
+        """Write a thumbnail into the canvas and mark the region dirty"""
+        t = self.thumb
+        x0, y0 = col * t, row * t
+        with self.lock:
+            self.canvas[y0:y0 + t, x0:x0 + t] = thumb
+            self.content[(row, col)] = content or (float(thumb.std()), True)
+            if self.dirty is None:
+                self.dirty = (x0, y0, x0 + t, y0 + t)
+            else:
+                dx0, dy0, dx1, dy1 = self.dirty
+                self.dirty = (min(dx0, x0), min(dy0, y0), max(dx1, x0 + t), max(dy1, y0 + t))
+
+    def score(self, row, col):
+        """
+        Content score of a tile: standard deviation of its thumbnail
+
+        Empty background is flat (low score); tissue has texture. Scored on
+        a fixed 0-255 scale, not the per-tile display stretch: 8-bit data as
+        it is, 12/16-bit data relative to the bit depth's full scale, so a
+        threshold means the same for both and an empty slide stays low.
+
+        Returns:
+            Score, or None if the tile has no thumbnail
+        """
+        with self.lock:
+            if (row, col) not in self.content:
+                return None
+            std, eight_bit = self.content[(row, col)]
+            if eight_bit:
+                return std
+            return std * 255.0 / self.full_scale
+
+    def take_dirty(self):
+        """
+        Changed region since the last call
+
+        Returns:
+            (x0, y0, pixels) with pixels a copy of the region, or None
+        """
+        with self.lock:
+            if self.dirty is None:
+                return None
+            x0, y0, x1, y1 = self.dirty
+            self.dirty = None
+            return x0, y0, self.canvas[y0:y1, x0:x1].copy()
+
+
+def photo_rows(pixels):
+    """Tk PhotoImage.put() data for a grayscale region"""
+    return " ".join(
+        "{" + " ".join(f"#{v:02x}{v:02x}{v:02x}" for v in row) + "}"
+        for row in pixels.tolist()
+    )
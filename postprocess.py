@@ -0,0 +1,296 @@
+"""
+Background post-compression of saved tiles
+
+Once a tile is saved, a small worker pool either re-encodes it losslessly
+(PNG or deflate TIFF) or packs it into zip archives keyed by row/col.
+Re-encoded pixels are compared with the original before the original is
+deleted; anything that fails is left untouched. Each worker fills its own
+archive and closes it every `chunk` tiles; that chunk's originals are
+only deleted once the closed archive reads back intact, so a crash
+mid-run never loses a tile and disk use never grows by more than a chunk
+per worker.
+
+The capture loop only calls submit(), which never blocks: when the
+bounded queue is full, tiles wait in an overflow list and are picked up
+as workers free up. The overflow has no limit - it is where backpressure
+goes, so a slow disk delays compression, never the scan; its peak length
+is reported. close() finishes everything at the end of the run.
+
+Re-encoding needs Pillow; zip packing only needs the standard library.
+"""
+
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from event_log import log
+
+MODES = ("png", "tiff", "zip")
+OUTPUT_FOLDER = "compressed"
+
+
+def available(mode):
+    """True if the dependencies for a compression mode are installed"""
+    return mode == "zip" or Image is not None
+
+
+class ArchiveChunk:
+    """
+    One zip archive of up to `chunk` tiles, written by a single worker
+
+    Args:
+        path: Archive file to create
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        self.originals = []  # deleted in finish() once the archive checks out
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, path, name):
+        """Write one tile into the archive (original kept for now)"""
+        self.zip.write(path, name)
+        self.originals.append(path)
+        return self.zip.getinfo(name).compress_size
+
+    def finish(self):
+        """
+        Close the archive, check it and only then delete the originals
+
+        Returns:
+            True if the archive read back intact
+        """
+        self.zip.close()
+        try:
+            with zipfile.ZipFile(self.path) as archive:
+                bad = archive.testzip()
+        except (OSError, zipfile.BadZipFile) as e:
+            bad = str(e)
+        if bad:
+            log.warning("Archive %s failed its check (%s); originals kept", self.path, bad)
+            return False
+
+        for path in self.originals:
+            try:
+                path.unlink()
+            except OSError as e:
+                log.warning("Could not remove %s after archiving: %s", path, e)
+        return True
+
+
+def same_pixels(a_path, b_path):
+    """True if two image files decode to identical pixels"""
+    with Image.open(a_path) as a, Image.open(b_path) as b:
+        return a.mode == b.mode and a.size == b.size and a.tobytes() == b.tobytes()
+
+
+class TileCompressor:
+    """
+    Bounded worker pool that compresses saved tiles
+
+    Args:
+        output_dir: Viewer output folder (results go in a subfolder)
+        mode: 'png', 'tiff' or 'zip'
+        workers: Number of worker threads
+        queue_size: Tiles queued before new ones go to the (unbounded)
+                    overflow list
+        chunk: Tiles per zip archive (zip mode)
+    """
+
+    def __init__(self, output_dir, mode, workers=2, queue_size=32, chunk=50):
+        if mode not in MODES:
+            raise ValueError(f"Unknown compression mode: {mode}")
+        self.mode = mode
+        self.folder = Path(output_dir) / OUTPUT_FOLDER
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        self.chunk = max(1, chunk)
+        self.chunks = 0  # archives started, for their file names
+        self.run_name = f"tiles_{datetime.now():%Y%m%d_%H%M%S}"
+
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.overflow = deque()
+        self.lock = threading.Lock()
+
+        # Stats
+        self.files = 0
+        self.failed = 0
+        self.deferred = 0
+        self.max_overflow = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.busy = 0.0  # seconds workers spent compressing, summed over workers
+
+        self.threads = [
+            threading.Thread(target=self.run, name=f"compress-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, path, row, col):
+        """Queue a saved tile without blocking"""
+        try:
+            self.jobs.put_nowait((path, row, col))
+        except queue.Full:
+            with self.lock:
+                self.overflow.append((path, row, col))
+                self.deferred += 1
+                self.max_overflow = max(self.max_overflow, len(self.overflow))
+
+    def refill(self):
+        """Move overflow tiles into the queue while there is room"""
+        with self.lock:
+            while self.overflow:
+                try:
+                    self.jobs.put_nowait(self.overflow[0])
+                except queue.Full:
+                    return
+                self.overflow.popleft()
+
+    def close(self):
+        """Finish every submitted tile, stop workers, close the archives"""
+        while True:
+            self.refill()
+            self.jobs.join()
+            with self.lock:
+                if not self.overflow:
+                    break
+
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        return self.stats()
+
+    def new_chunk(self):
+        """Start the next zip archive of the run"""
+        with self.lock:
+            self.chunks += 1
+            number = self.chunks
+        return ArchiveChunk(self.folder / f"{self.run_name}_{number:04d}.zip")
+
+    def finish_chunk(self, chunk):
+        """Close and check a zip archive; count its tiles as failed if bad"""
+        start = time.perf_counter()
+        ok = chunk.finish()
+        with self.lock:
+            self.busy += time.perf_counter() - start
+            if ok:
+                return
+            self.files -= len(chunk.originals)
+            self.failed += len(chunk.originals)
+            self.bytes_out += chunk.bytes_in - chunk.bytes_out
+
+    def run(self):
+        """Worker loop"""
+        chunk = None  # this worker's open zip archive
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                if chunk:
+                    self.finish_chunk(chunk)
+                self.jobs.task_done()
+                return
+
+            start = time.perf_counter()
+            try:
+                if self.mode == "zip":
+                    chunk = chunk or self.new_chunk()
+                    size_in, size_out = self.archive_tile(chunk, *job)
+                else:
+                    size_in, size_out = self.compress(*job)
+                with self.lock:
+                    self.files += 1
+                    self.bytes_in += size_in
+                    self.bytes_out += size_out
+            except Exception as e:
+                log.warning("Compression failed for %s: %s", job[0], e)
+                with self.lock:
+                    self.failed += 1
+            finally:
+                with self.lock:
+                    self.busy += time.perf_counter() - start
+                self.jobs.task_done()
+                self.refill()
+
+            if chunk and len(chunk.originals) >= self.chunk:
+                self.finish_chunk(chunk)
+                chunk = None
+
+    def archive_tile(self, chunk, path, row, col):
+        """
+        Add one tile to a zip archive; the original goes when the chunk is done
+
+        Returns:
+            (bytes before, bytes after)
+        """
+        path = Path(path)
+        size_in = path.stat().st_size
+        name = f"r{row:04d}_c{col:04d}_{path.stem}{path.suffix.lower()}"
+        size_out = chunk.add(path, name)
+        chunk.bytes_in += size_in
+        chunk.bytes_out += size_out
+        return size_in, size_out
+
+    def compress(self, path, row, col):
+        """
+        Re-encode one tile, removing the original only once verified
+
+        Returns:
+            (bytes before, bytes after)
+        """
+        path = Path(path)
+        size_in = path.stat().st_size
+
+        suffix = ".png" if self.mode == "png" else ".tif"
+        target = self.folder / f"r{row:04d}_c{col:04d}_{path.stem}{suffix}"
+        with Image.open(path) as image:
+            if getattr(image, "n_frames", 1) > 1:
+                raise ValueError("multi-page images are left as they are")
+            if self.mode == "png":
+                image.save(target, compress_level=6)
+            else:
+                image.save(target, compression="tiff_adobe_deflate")
+
+        size_out = target.stat().st_size
+        if size_out >= size_in or not same_pixels(path, target):
+            # Not smaller (already compressed) or not lossless: keep original
+            target.unlink()
+            return size_in, size_in
+
+        os.remove(path)
+        return size_in, size_out
+
+    def stats(self):
+        """
+        Bytes saved and throughput so far
+
+        Throughput is bytes compressed per second a worker was busy, so it
+        measures compression speed, not how fast tiles were captured.
+        """
+        with self.lock:
+            throughput = self.bytes_in / self.busy if self.busy else 0.0
+            return {
+                "files": self.files,
+                "failed": self.failed,
+                "deferred": self.deferred,
+                "max_overflow": self.max_overflow,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "mb_per_second": throughput / 1e6
+            }
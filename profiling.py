@@ -0,0 +1,212 @@
+"""
+Opt-in sampling profiler for the automation thread
+
+A background thread snapshots the automation thread's Python stack every
+few milliseconds (sys._current_frames), so the scan itself runs
+uninstrumented. Each sample is attributed to one category:
+
+    sleep      - our own time.sleep() waits (the configured delays),
+                 including pyautogui's `interval` waits between keys
+    gui_pause  - pyautogui's built-in PAUSE after every click/press
+    gui        - the rest of pyautogui (mouse moves, key events)
+    ui         - Tk updates (progress bar, labels)
+    logging    - log calls
+    own        - everything else in our code
+
+Stacks are written in folded format ("a;b;c count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+"""
+
+import dis
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+CATEGORIES = ("sleep", "gui_pause", "gui", "ui", "logging", "own")
+
+GUI_MODULES = ("pyautogui", "pyscreeze", "pymsgbox", "pytweening", "mouseinfo")
+UI_MODULES = ("tkinter",)
+LOGGING_MODULES = ("logging", "event_log")
+
+# pyautogui functions whose sleeps are the `interval` we pass (key_interval)
+INTERVAL_FUNCTIONS = ("press", "hotkey", "typewrite", "write")
+
+SLEEP_LINES = {}  # code object -> line numbers that call sleep()
+
+
+def frame_module(frame):
+    """Top-level module (package) name a frame's code lives in"""
+    module = frame.f_globals.get("__name__", "?")
+    return module.split(".")[0]
+
+
+def sleep_lines(code):
+    """
+    Line numbers in a code object that call a function named sleep
+
+    Read from the bytecode, so it also works without the source files
+    (e.g. in the PyInstaller build).
+    """
+    lines = SLEEP_LINES.get(code)
+    if lines is None:
+        lines = set()
+        line = None
+        for instruction in dis.get_instructions(code):
+            # Python 3.13+ has line_number; before that starts_line is the number
+            number = getattr(instruction, "line_number", instruction.starts_line)
+            if number is not None:
+                line = number
+            if instruction.argval == "sleep" and instruction.opname.startswith("LOAD_"):
+                lines.add(line)
+        SLEEP_LINES[code] = lines
+    return lines
+
+
+def is_sleeping(frame):
+    """True if a (leaf) frame is inside a sleep() call"""
+    return frame.f_lineno in sleep_lines(frame.f_code)
+
+
+def categorize(frames):
+    """
+    Category for one stack sample
+
+    Args:
+        frames: List of frames, root first
+    """
+    modules = [frame_module(f) for f in frames]
+
+    for frame, module in zip(frames, modules):
+        if module == "pyautogui" and frame.f_code.co_name == "_handlePause":
+            return "gui_pause"
+
+    leaf, leaf_module = frames[-1], modules[-1]
+    if is_sleeping(leaf):
+        if leaf_module not in GUI_MODULES:
+            return "sleep"
+        if leaf_module == "pyautogui" and leaf.f_code.co_name in INTERVAL_FUNCTIONS:
+            return "sleep"
+
+    if any(m in GUI_MODULES for m in modules):
+        return "gui"
+    if any(m in UI_MODULES for m in modules):
+        return "ui"
+    if any(m in LOGGING_MODULES for m in modules):
+        return "logging"
+    return "own"
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack at a fixed interval
+
+    Args:
+        thread_id: threading.get_ident() of the thread to profile
+        interval: Seconds between samples
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.samples = 0
+        self.running = False
+        self.thread = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and return the summary report"""
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.report()
+
+    def sample_loop(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.record(frame)
+            del frame
+            time.sleep(self.interval)
+
+    def record(self, frame):
+        """Add one stack sample"""
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+
+        category = categorize(frames)
+        names = [f"{frame_module(f)}:{f.f_code.co_name}" for f in frames]
+        if category == "sleep":
+            names.append("time:sleep")
+
+        self.stacks[";".join(names)] += 1
+        self.categories[category] += 1
+        self.samples += 1
+
+    def seconds_by_category(self):
+        """Wall time attributed to each category"""
+        if not self.samples:
+            return {category: 0.0 for category in CATEGORIES}
+        per_sample = self.elapsed / self.samples
+        return {category: self.categories[category] * per_sample for category in CATEGORIES}
+
+    def report(self):
+        """
+        Summary of where the thread spent its time
+
+        Returns:
+            dict with elapsed, samples, seconds/percent per category and
+            the pyautogui PAUSE setting with the time it cost
+        """
+        seconds = self.seconds_by_category()
+        try:
+            import pyautogui
+            pause = pyautogui.PAUSE
+        except ImportError:
+            pause = None
+
+        return {
+            "elapsed": self.elapsed,
+            "samples": self.samples,
+            "seconds": seconds,
+            "percent": {
+                category: (100.0 * value / self.elapsed if self.elapsed else 0.0)
+                for category, value in seconds.items()
+            },
+            "pyautogui_pause": pause,
+            "pause_seconds": seconds["gui_pause"]
+        }
+
+    def write_folded(self, path):
+        """Write stacks in folded (flamegraph) format"""
+        path = Path(path)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def format_report(report):
+    """Human-readable lines for a profiler report"""
+    lines = [f"Profile: {report['elapsed']:.1f}s, {report['samples']} samples"]
+    for category in CATEGORIES:
+        lines.append(
+            f"  {category:<10} {report['seconds'][category]:8.1f}s "
+            f"{report['percent'][category]:5.1f}%"
+        )
+    return lines
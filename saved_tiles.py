@@ -0,0 +1,180 @@
+"""
+Finding the file the Viewer saved for each captured tile, off the capture
+thread
+
+The capture loop only calls submit(row, col, since). A background thread
+lists the output folder, stat()s only names it hasn't seen before and
+hands each new image to a callback, in capture order, once its size has
+stopped changing (the Viewer may still be writing it). Files already
+seen are never looked at again, so the work per tile stays flat as the
+folder fills up during a long run.
+
+A tile only takes a file modified between its own start and the start of
+the next tile, so a save the Viewer skipped leaves that one tile without
+a file instead of shifting every later tile by one.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from event_log import log
+
+IMAGE_EXTENSIONS = ('.tif', '.tiff', '.png', '.jpg', '.jpeg', '.bmp')
+POLL_SECONDS = 0.05
+MISSING_SECONDS = 10.0  # give up on a tile whose file never appears
+SETTLE_SECONDS = 0.25   # size unchanged this long = the file is complete
+MTIME_SLACK = 0.05      # file times come from a coarser clock than time.time()
+
+
+class SavedTileWatcher:
+    """
+    Matches new image files in the output folder to captured tiles
+
+    Each tile gets the oldest unmatched image modified at or after its
+    capture started and before the next tile's capture started.
+
+    Args:
+        folder: Viewer output folder
+        deliver: Called as deliver(row, col, path) on the watcher thread
+    """
+
+    def __init__(self, folder, deliver):
+        self.folder = folder
+        self.deliver = deliver
+        self.seen = set(self.list_names())  # files from before the run
+        self.new_files = {}  # unmatched path -> mtime
+        self.sizes = {}      # path being settled -> (size, time first seen at it)
+
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="saved-tiles", daemon=True)
+        self.thread.start()
+
+    def submit(self, row, col, since):
+        """Look for the file of a tile captured after `since` (time.time())"""
+        self.jobs.put((row, col, since, time.time()))
+
+    def wait(self):
+        """Block until every submitted tile has been matched or given up"""
+        self.end_tiles()
+        self.jobs.join()
+
+    def close(self):
+        """Finish submitted tiles and stop the background thread"""
+        self.end_tiles()
+        self.jobs.put(None)
+        self.thread.join()
+
+    def end_tiles(self):
+        """
+        Mark that no more tiles follow for now
+
+        Until the next tile starts, the last submitted tile can't tell
+        its own file from the next tile's, so it waits for this (or the
+        next submit) before it is matched.
+        """
+        self.jobs.put((None, None, time.time(), None))
+
+    def list_names(self):
+        """Names of the images in the folder"""
+        try:
+            with os.scandir(self.folder) as entries:
+                return [e.name for e in entries if e.name.lower().endswith(IMAGE_EXTENSIONS)]
+        except OSError as e:
+            log.warning("Cannot read output folder %s: %s", self.folder, e)
+            return []
+
+    def scan(self):
+        """stat() the images that appeared since the last scan"""
+        for name in self.list_names():
+            if name in self.seen:
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                self.new_files[path] = os.stat(path).st_mtime
+            except OSError:
+                continue  # gone again (or not readable yet): retry next scan
+            self.seen.add(name)
+
+    def settled(self, path):
+        """
+        True once a file's size has stayed the same for SETTLE_SECONDS
+
+        Returns:
+            True, False (still changing) or None if the file is gone
+        """
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return None
+        now = time.time()
+        last_size, since = self.sizes.get(path, (None, now))
+        if size != last_size or size == 0:
+            self.sizes[path] = (size, now)
+            return False
+        return now - since >= SETTLE_SECONDS
+
+    def run(self):
+        """Match tiles to files (background thread)"""
+        pending = deque()
+        closing = False
+        while pending or not closing:
+            try:
+                job = self.jobs.get(timeout=POLL_SECONDS) if pending else self.jobs.get()
+            except queue.Empty:
+                job = False
+            if job is None:
+                closing = True
+                self.jobs.task_done()
+            elif job:
+                pending.append(job)
+            if pending:
+                self.scan()
+                self.match(pending)
+
+    def match(self, pending):
+        """Deliver files for the oldest pending tiles, in capture order"""
+        while pending:
+            row, col, since, submitted = pending[0]
+            if row is None:
+                pending.popleft()  # end_tiles() marker
+                self.jobs.task_done()
+                continue
+            if len(pending) < 2:
+                return  # wait for the next tile's start (or end_tiles) as a bound
+            if pending[1][0] is None:
+                until = float('inf')  # no tile follows: any later file is this one's
+            else:
+                until = pending[1][2] + MTIME_SLACK
+
+            # Anything older than the oldest pending tile can't belong to one
+            for path in [p for p, mtime in self.new_files.items()
+                         if mtime < since - MTIME_SLACK]:
+                del self.new_files[path]
+
+            path = min(self.new_files, key=self.new_files.get, default=None)
+            if path is None:
+                if time.time() - submitted < MISSING_SECONDS:
+                    return
+                log.debug("No saved file found for tile (%d, %d)", row, col)
+            elif self.new_files[path] >= until:
+                # The oldest new file was saved after the next tile started,
+                # so this tile's save never happened: leave that file alone
+                log.debug("No saved file found for tile (%d, %d)", row, col)
+            else:
+                settled = self.settled(path)
+                if settled is False:
+                    return  # still being written: check again next poll
+                del self.new_files[path]
+                self.sizes.pop(path, None)
+                if settled is None:
+                    continue  # removed before it settled: try the next file
+                try:
+                    self.deliver(row, col, path)
+                except Exception as e:
+                    log.warning("Could not hand on %s: %s", path, e)
+
+            pending.popleft()
+            self.jobs.task_done()
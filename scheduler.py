@@ -0,0 +1,295 @@
+"""
+Scan scheduling - predict how long each queued scan takes and order the
+queue to fit as many scans as possible into a time window
+
+Jobs are dicts (same format as orchestration.py, plus an optional
+deadline in hours from now):
+    {"id": "slide-1", "width": 5, "height": 8, "profile": "fast 10x",
+     "deadline_hours": 6}
+
+Estimates come from the configured delays plus the learned per-tile
+overhead in latency_profile.json (LatencyProfile), which run_automation
+and the station workers update from live tile timings.
+
+Plan a queue from the command line:
+    python scheduler.py jobs.json --order deadline --window 10
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+from config import Config
+from event_log import log
+from grid_navigator import GridNavigator
+
+POLICIES = ("fifo", "sjf", "deadline")
+
+
+# ==============================================================================
+# LATENCY PROFILE
+# ==============================================================================
+
+def predicted_tile_seconds(settings, directions=(), move_class='start'):
+    """Configured time for one tile: its move plus the capture sequence"""
+    capture = settings['capture_delay'] + settings['ok_delay'] + settings['live_delay']
+    return capture + GridNavigator.move_seconds(directions, move_class, settings)
+
+
+def check_job(job, profiles):
+    """
+    Validate a scan job
+
+    Args:
+        job: Job dict
+        profiles: Profile names the job may use
+
+    Returns:
+        (width, height, profile)
+
+    Raises:
+        ValueError: if the job can't be run
+    """
+    if not isinstance(job, dict):
+        raise ValueError("a job must be an object")
+    try:
+        width, height = int(job["width"]), int(job["height"])
+    except KeyError as e:
+        raise ValueError(f"missing {e}")
+    except (TypeError, ValueError):
+        raise ValueError("width and height must be integers")
+    if width < 1 or height < 1:
+        raise ValueError("width and height must be positive")
+
+    profile = job.get("profile")
+    if profile is not None and profile not in profiles:
+        raise ValueError(f"Unknown profile: {profile}")
+
+    deadline = job.get("deadline_hours")
+    if deadline is not None and (isinstance(deadline, bool) or
+                                 not isinstance(deadline, (int, float))):
+        raise ValueError("deadline_hours must be a number")
+    return width, height, profile
+
+
+class LatencyProfile:
+    """
+    Learned per-tile overhead on top of the configured delays
+    
+    Covers everything the delays don't: GUI automation, disk, Viewer lag.
+    Kept in its own file so saving it never triggers a config.json reload.
+    """
+    
+    ALPHA = 0.05  # weight of each new tile in the moving average
+    
+    def __init__(self, file="latency_profile.json"):
+        self.file = Path(file)
+        self.tile_overhead = 0.0
+        self.samples = 0
+        self.load()
+    
+    def load(self):
+        """Load the saved profile (missing file = no overhead yet)"""
+        if not self.file.exists():
+            return
+        try:
+            with open(self.file, 'r') as f:
+                data = json.load(f)
+            self.tile_overhead = float(data["tile_overhead"])
+            self.samples = int(data["samples"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring latency profile %s: %s", self.file, e)
+    
+    def save(self):
+        """Save the profile"""
+        with open(self.file, 'w') as f:
+            json.dump({"tile_overhead": self.tile_overhead, "samples": self.samples}, f, indent=2)
+    
+    def record(self, actual, predicted):
+        """Update the overhead from one tile's measured and predicted time"""
+        overhead = actual - predicted
+        if self.samples == 0:
+            self.tile_overhead = overhead
+        else:
+            self.tile_overhead += self.ALPHA * (overhead - self.tile_overhead)
+        self.samples += 1
+
+# ==============================================================================
+# SCHEDULER
+# ==============================================================================
+
+class Scheduler:
+    """
+    Estimates job durations and orders a queue of jobs
+
+    Args:
+        config: Config (for delays and profiles)
+        latency: LatencyProfile with the learned per-tile overhead
+    """
+
+    def __init__(self, config, latency):
+        self.config = config
+        self.latency = latency
+
+    def estimate(self, job):
+        """Predicted duration of a (valid) job in seconds"""
+        settings = self.config.settings(job.get("profile"))
+        width, height = int(job["width"]), int(job["height"])
+        pattern = settings['scan_pattern']
+        if pattern == 'auto':
+            pattern = GridNavigator.fastest_pattern(width, height, settings)
+        moves = GridNavigator(width, height, pattern).get_moves()
+
+        seconds = sum(
+            predicted_tile_seconds(settings, directions, move_class)
+            for pos, directions, move_class in moves
+        )
+        return seconds + len(moves) * self.latency.tile_overhead
+
+    def plan(self, jobs, policy="sjf", window_hours=None, free_at=(0.0,), elapsed_hours=0.0):
+        """
+        Order jobs and predict when each one runs
+
+        Policies:
+            fifo     - as given
+            sjf      - shortest first (most scans finished per window)
+            deadline - earliest deadline first, dropping the longest jobs
+                       that would make others miss (Moore-Hodgson); jobs
+                       that can't make their deadline go last
+
+        Jobs in run order go to whichever station is free first.
+
+        Ties are broken by job id then queue position, so the same input
+        always gives the same plan. Invalid jobs are not planned; they are
+        listed last with an "error" so the caller can reject them.
+
+        Args:
+            jobs: List of job dicts
+            window_hours: Length of the window; jobs ending later don't fit
+            free_at: Seconds from now until each station is free (one
+                     entry per station)
+            elapsed_hours: Time since the window and deadlines started
+
+        Returns:
+            List of {"job", "estimate", "station", "start", "end", "fits"}
+            (station is an index into free_at, times are seconds from now),
+            in run order
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+
+        elapsed = elapsed_hours * 3600
+        window = window_hours * 3600 - elapsed if window_hours else float("inf")
+        profiles = self.config.profile_names()
+        items = []
+        invalid = []
+        for i, job in enumerate(jobs):
+            try:
+                check_job(job, profiles)
+            except ValueError as e:
+                invalid.append({"job": job, "estimate": None, "station": None, "start": None,
+                                "end": None, "fits": False, "error": str(e)})
+                continue
+            deadline = window
+            if job.get("deadline_hours") is not None:
+                deadline = min(window, job["deadline_hours"] * 3600 - elapsed)
+            items.append({"index": i, "job": job, "estimate": self.estimate(job),
+                          "deadline": deadline})
+
+        def shortest(item):
+            return (item["estimate"], str(item["job"].get("id", "")), item["index"])
+
+        if policy == "sjf":
+            items.sort(key=shortest)
+        elif policy == "deadline":
+            items = self.moore_hodgson(items, shortest, free_at)
+
+        schedule = [
+            {
+                "job": item["job"],
+                "estimate": item["estimate"],
+                "station": station,
+                "start": start,
+                "end": end,
+                "fits": end <= item["deadline"]
+            }
+            for item, station, start, end in self.assign(items, free_at)
+        ]
+        return schedule + invalid
+
+    @staticmethod
+    def assign(items, free_at):
+        """
+        Give items, in order, to whichever station is free first
+
+        Returns:
+            List of (item, station, start, end)
+        """
+        free = list(free_at) or [0.0]
+        timeline = []
+        for item in items:
+            station = min(range(len(free)), key=free.__getitem__)
+            start = free[station]
+            free[station] = start + item["estimate"]
+            timeline.append((item, station, start, free[station]))
+        return timeline
+
+    @classmethod
+    def moore_hodgson(cls, items, shortest, free_at=(0.0,)):
+        """
+        Maximise the number of jobs finishing by their deadline
+
+        With one station this is Moore-Hodgson; with several, the on-time
+        jobs are re-assigned to stations after each addition and the
+        longest one is dropped while any of them would be late.
+        """
+        on_time = []
+        late = []
+        for item in sorted(items, key=lambda i: (i["deadline"],) + shortest(i)):
+            on_time.append(item)
+            while any(end > i["deadline"] for i, station, start, end
+                      in cls.assign(on_time, free_at)):
+                longest = max(on_time, key=shortest)
+                on_time.remove(longest)
+                late.append(longest)
+        return on_time + sorted(late, key=shortest)
+
+
+def format_plan(schedule):
+    """Table lines for a plan"""
+    lines = [f"{'#':>3}  {'job':<20} {'minutes':>8} {'station':>7} {'ends':>8}  fits"]
+    for i, entry in enumerate(schedule, 1):
+        job = entry["job"]
+        name = str(job.get("id", "-")) if isinstance(job, dict) else "-"
+        if entry.get("error"):
+            lines.append(f"{i:>3}  {name:<20} invalid: {entry['error']}")
+            continue
+        lines.append(
+            f"{i:>3}  {name:<20} {entry['estimate'] / 60:8.1f} {entry['station'] + 1:>7} "
+            f"{entry['end'] / 3600:7.2f}h  {'yes' if entry['fits'] else 'NO'}"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan the order of queued scans")
+    parser.add_argument("jobs", help="JSON file with a list of jobs")
+    parser.add_argument("--order", choices=POLICIES, default="sjf")
+    parser.add_argument("--window", type=float, help="window length in hours")
+    parser.add_argument("--stations", type=int, default=1, help="stations running the queue")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--latency", default="latency_profile.json")
+    args = parser.parse_args()
+
+    with open(args.jobs, 'r') as f:
+        jobs = json.load(f)
+
+    scheduler = Scheduler(Config(args.config), LatencyProfile(args.latency))
+    schedule = scheduler.plan(jobs, args.order, args.window, [0.0] * max(1, args.stations))
+    print("\n".join(format_plan(schedule)))
+    fitting = sum(1 for entry in schedule if entry["fits"])
+    print(f"{fitting} of {len(schedule)} scans fit")
+
+
+if __name__ == "__main__":
+    main()